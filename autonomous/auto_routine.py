@@ -13,7 +13,7 @@ class AutoRoutine:
     command: CommandBase
 
     def run(self):
-        Robot.drivetrain.odometry.resetPosition(
+        Robot.drivetrain.reset_odometry(
             self.initial_robot_pose,
             self.initial_robot_pose.rotation()
         )
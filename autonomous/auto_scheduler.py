@@ -0,0 +1,227 @@
+from dataclasses import dataclass, field
+from typing import Callable
+
+import commands2
+import wpilib
+from robotpy_toolkit_7407.command import Command
+from wpimath.geometry import Pose2d
+
+from robot_systems import Robot
+
+
+@dataclass
+class AutoStep:
+    '''
+    One action in an auto routine and what it waits for
+    '''
+    name: str
+    command: commands2.Command
+    after: tuple[str, ...] = ()  # steps that have to finish first
+    when: tuple[Callable[[], bool], ...] = ()  # conditions that have to hold once the after steps are done
+    max_wait: float | None = None  # seconds to wait on the conditions before starting anyway
+    start_after: tuple[str, ...] = ()  # start anyway once these finish, even if the conditions don't hold
+    stop_after: tuple[str, ...] = ()  # interrupt this step once these finish, for commands that never end
+    estimate: float = 0  # expected seconds, for the planned critical path
+
+    start: float | None = field(default=None, init=False)
+    end: float | None = field(default=None, init=False)
+    ready: float | None = field(default=None, init=False)  # when it could first start, once the after steps were all done
+    blocked_by: str = field(default="", init=False)  # what it was last waiting on before it started
+
+
+# Conditions for AutoStep.when, named so the report can say what a step waited on
+
+def flywheels_ready() -> bool:
+    # Feeding now gets the ball to the wheels no earlier than they're at speed
+    return Robot.feed_scheduler.should_feed(wpilib.Timer.getFPGATimestamp())
+
+
+def ball_staged() -> bool:
+    return Robot.index.photo_electric.value
+
+
+def pose_within(pose: Pose2d, tolerance: float) -> Callable[[], bool]:
+    '''
+    :Param float tolerance: meters from pose the robot has to be
+    '''
+    def condition():
+        return Robot.drivetrain.get_pose().translation().distance(pose.translation()) < tolerance
+    condition.__name__ = f"pose within {tolerance}m"
+    return condition
+
+
+class AutoScheduler(Command):
+    '''
+    Runs auto steps as soon as the steps they come after are done and their conditions hold,
+    instead of back to back with fixed waits. Steps that share a subsystem never run at the same time.
+
+    When it ends it prints the critical path: the chain of steps that set the finish time,
+    and how long each one ran and waited on conditions.
+    '''
+
+    def __init__(self, steps: list[AutoStep], clock: Callable[[], float] = wpilib.Timer.getFPGATimestamp):
+        super().__init__()
+        self.steps = steps
+        self.by_name = {step.name: step for step in steps}
+        if len(self.by_name) != len(steps):
+            raise ValueError("auto step names have to be unique")
+        for step in steps:
+            for name in step.after + step.stop_after + step.start_after:
+                if name not in self.by_name:
+                    raise ValueError(f"auto step {step.name} depends on unknown step {name}")
+        self._check_cycles()
+
+        self.clock = clock
+        self.requirements = {step.name: set(step.command.getRequirements()) for step in steps}
+        for subsystems in self.requirements.values():
+            if subsystems:
+                self.addRequirements(*subsystems)
+
+        self.start_time = 0
+        self.running: list[AutoStep] = []
+        self.pending: list[AutoStep] = []
+
+    def _check_cycles(self):
+        visiting, done = set(), set()
+
+        def visit(step):
+            if step.name in done:
+                return
+            if step.name in visiting:
+                raise ValueError(f"auto step {step.name} depends on itself")
+            visiting.add(step.name)
+            for name in step.after:
+                visit(self.by_name[name])
+            visiting.discard(step.name)
+            done.add(step.name)
+
+        for s in self.steps:
+            visit(s)
+
+    def finished(self, name: str) -> bool:
+        return self.by_name[name].end is not None
+
+    def planned_time(self) -> float:
+        '''
+        Critical path time from the step estimates, if every condition held as soon as it was checked
+        '''
+        finish = {}
+
+        def finish_time(step):
+            if step.name not in finish:
+                finish[step.name] = max((finish_time(self.by_name[n]) for n in step.after), default=0) + step.estimate
+            return finish[step.name]
+
+        return max((finish_time(step) for step in self.steps), default=0)
+
+    def initialize(self) -> None:
+        self.start_time = self.clock()
+        for step in self.steps:
+            step.start = step.end = step.ready = None
+            step.blocked_by = ""
+        self.running = []
+        self.pending = list(self.steps)
+
+    def execute(self) -> None:
+        now = self.clock()
+        for step in list(self.running):
+            self._run(step, now)
+        # Finishing a step can let others start in the same tick, instant commands can chain
+        started = self._start_ready(now)
+        while started:
+            for step in started:
+                self._run(step, now)
+            started = self._start_ready(now)
+
+    def _start_ready(self, now: float) -> list[AutoStep]:
+        started = []
+        for step in list(self.pending):
+            if not all(self.finished(name) for name in step.after):
+                continue
+            if step.stop_after and all(self.finished(name) for name in step.stop_after):
+                # Whatever this step was meant to run alongside is already over, skip it
+                self.pending.remove(step)
+                step.ready = step.start = step.end = now
+                step.blocked_by = ""
+                continue
+            if step.ready is None:
+                step.ready = max((self.by_name[name].end for name in step.after), default=now)
+
+            waiting = [getattr(c, "__name__", "condition") for c in step.when if not c()]
+            timed_out = step.max_wait is not None and now - step.ready >= step.max_wait
+            overdue = step.start_after and all(self.finished(name) for name in step.start_after)
+            if waiting and not timed_out and not overdue:
+                step.blocked_by = ", ".join(waiting)
+                continue
+            busy = [s.name for s in self.running if self.requirements[s.name] & self.requirements[step.name]]
+            if busy:
+                step.blocked_by = ", ".join(busy)
+                continue
+
+            step.start = now
+            step.command.initialize()
+            self.pending.remove(step)
+            self.running.append(step)
+            started.append(step)
+        return started
+
+    def _run(self, step: AutoStep, now: float):
+        if step not in self.running:
+            # Stopped by a step that finished earlier this tick
+            return
+        step.command.execute()
+        if step.command.isFinished():
+            self._finish(step, now, False)
+
+    def _finish(self, step: AutoStep, now: float, interrupted: bool):
+        step.command.end(interrupted)
+        step.end = now
+        self.running.remove(step)
+        for other in list(self.running):
+            if other in self.running and other.stop_after and all(self.finished(name) for name in other.stop_after):
+                self._finish(other, now, True)
+
+    def isFinished(self) -> bool:
+        return not self.pending and not self.running
+
+    def end(self, interrupted: bool) -> None:
+        now = self.clock()
+        for step in list(self.running):
+            if step in self.running:
+                self._finish(step, now, True)
+        self.report()
+
+    def critical_path(self) -> list[AutoStep]:
+        '''
+        Steps that set the finish time, first to last. Each one's start was held by the
+        step before it (the last of its after steps to finish) plus whatever it waited on after that.
+        '''
+        done = [step for step in self.steps if step.end is not None]
+        if not done:
+            return []
+        step = max(done, key=lambda s: s.end)
+        path = []
+        while step is not None:
+            path.append(step)
+            before = [self.by_name[name] for name in step.after]
+            step = max(before, key=lambda s: s.end) if before else None
+        path.reverse()
+        return path
+
+    def report(self):
+        path = self.critical_path()
+        total = path[-1].end - self.start_time if path else 0
+        print(f"Auto critical path: {total:.2f}s (planned {self.planned_time():.2f}s)")
+        for step in path:
+            wait = step.start - step.ready
+            line = f"  {step.name}: ran {step.end - step.start:.2f}s"
+            if step.blocked_by and wait > 0:
+                line += f", waited {wait:.2f}s on {step.blocked_by}"
+            print(line)
+        not_run = [step.name for step in self.steps if step.start is None]
+        if not_run:
+            print(f"  never started: {', '.join(not_run)}")
+        wpilib.SmartDashboard.putNumber("Auto Critical Path", total)
+
+    def runsWhenDisabled(self) -> bool:
+        return False
@@ -1,14 +1,15 @@
 import dataclasses
 import math
 
-from commands2 import SequentialCommandGroup, ParallelCommandGroup, InstantCommand, WaitCommand
-from robotpy_toolkit_7407.utils.units import m, rad, deg, s, ft, inch
+from commands2 import SequentialCommandGroup, InstantCommand, WaitCommand
+from robotpy_toolkit_7407.utils.units import m, rad, deg, ft, inch
 from wpimath.geometry import Pose2d
 
 import constants
 from autonomous.auto_routine import AutoRoutine
-from autonomous.follow_path import FollowPathCustom, RotateInPlace
-from autonomous.trajectory import generate_trajectory_from_pose, TrajectoryEndpoint, generate_trajectory
+from autonomous.auto_scheduler import AutoScheduler, AutoStep, ball_staged, flywheels_ready, pose_within
+from autonomous.follow_path import FollowPathCustom
+from autonomous.trajectory import TrajectoryEndpoint, generate_holonomic_trajectory, PathConstraints, point_before_end
 from command import IndexOn, IndexOff
 from command.shooter import ShooterEnableAtDistance
 from robot_systems import Robot
@@ -36,70 +37,58 @@ fourth_path_start_pose.angle = 0 * deg
 fourth_path_end_pose = dataclasses.replace(second_path_end_pose)
 fourth_path_end_pose.angle = 0 * deg
 
+# Each path turns on the way to the heading it shoots from at its end, instead of rotating in place after.
+# The first two pick up a ball on the way in, they reach the intake heading (-90 and -13, where the old
+# RotateInPlace steps started from) by the pickup and turn to shoot over the last auto_pickup_turn_distance
 first_path = FollowPathCustom(
     Robot.drivetrain,
-    generate_trajectory_from_pose(initial_robot_pose, [], first_path_end_pose, 8 * m/s, 1.5 * m/(s*s)),
-    -90 * deg,
-    period=constants.period
-)
-
-rotate_1 = RotateInPlace(
-    Robot.drivetrain,
-    -12 * deg, #-14
-    0.8,
+    generate_holonomic_trajectory(
+        initial_robot_pose,
+        [point_before_end(initial_robot_pose, first_path_end_pose.as_pose(), constants.auto_pickup_turn_distance)],
+        first_path_end_pose.as_pose(),
+        initial_gyro_angle.asNumber(rad),
+        (-12 * deg).asNumber(rad),  # -14
+        PathConstraints(max_accel=1.5),
+        waypoint_headings=[(-90 * deg).asNumber(rad)]
+    ),
     period=constants.period
 )
 
 second_path = FollowPathCustom(
     Robot.drivetrain,
-    generate_trajectory(
-        second_path_start_pose,
-        [],
-        second_path_end_pose,
-        10 * m/s,
-        4 * m/(s*s)
+    generate_holonomic_trajectory(
+        second_path_start_pose.as_pose(),
+        [point_before_end(second_path_start_pose.as_pose(), second_path_end_pose.as_pose(),
+                          constants.auto_pickup_turn_distance)],
+        second_path_end_pose.as_pose(),
+        (-12 * deg).asNumber(rad),
+        (-51 * deg).asNumber(rad),
+        waypoint_headings=[(-13 * deg).asNumber(rad)]
     ),
-    -13 * deg,
-    period=constants.period
-)
-
-rotate_2 = RotateInPlace(
-    Robot.drivetrain,
-    -51 * deg,
-    0.5,
     period=constants.period
 )
 
 third_path = FollowPathCustom(
     Robot.drivetrain,
-    generate_trajectory(
-        third_path_start_pose,
+    generate_holonomic_trajectory(
+        third_path_start_pose.as_pose(),
         [],
-        third_path_end_pose,
-        11 * m/s,
-        5 * m/(s*s)
+        third_path_end_pose.as_pose(),
+        (-51 * deg).asNumber(rad),
+        (35 * deg).asNumber(rad)
     ),
-    35 * deg,
-    period=constants.period
-)
-
-rotate_3 = RotateInPlace(
-    Robot.drivetrain,
-    -72.5 * deg,
-    1,
     period=constants.period
 )
 
 fourth_path = FollowPathCustom(
     Robot.drivetrain,
-    generate_trajectory(
-        fourth_path_start_pose,
+    generate_holonomic_trajectory(
+        fourth_path_start_pose.as_pose(),
         [],
-        fourth_path_end_pose,
-        9 * m/s,
-        5 * m/(s*s)
+        fourth_path_end_pose.as_pose(),
+        (35 * deg).asNumber(rad),
+        (-49 * deg).asNumber(rad)
     ),
-    -49 * deg,
     period=constants.period
 )
 
@@ -135,66 +124,58 @@ def rezero():
     Robot.drivetrain.gyro._gyro.setYaw(math.degrees(Robot.drivetrain.gyro.get_robot_heading()) + 90)
 
 
-final_command = SequentialCommandGroup(
-    InstantCommand(zero),
-    WaitCommand(0.3),
-    ParallelCommandGroup(
-        first_path,
-        InstantCommand(right_intake_on, Robot.intake)
+def feed(seconds: float):
+    return SequentialCommandGroup(
+        IndexOn().alongWith(InstantCommand(Robot.index.dinglebobs_in, Robot.intake)),
+        WaitCommand(seconds),
+        IndexOff(), InstantCommand(Robot.index.dinglebobs_off, Robot.index)
+    )
+
+
+# Each step starts as soon as what it's after is done and its conditions hold
+final_command = AutoScheduler([
+    AutoStep("zero", InstantCommand(zero)),
+    AutoStep("settle", WaitCommand(0.3), after=("zero",), estimate=0.3),
+    AutoStep("right intake on", InstantCommand(right_intake_on, Robot.intake), after=("settle",)),
+    AutoStep("path 1", first_path, after=("settle",), estimate=first_path.duration),
+    AutoStep(
+        "spin up 1", ShooterEnableAtDistance(Robot.shooter, 2.4), # Was 2.7s
+        when=(pose_within(first_path_end_pose.as_pose(), constants.auto_spin_up_distance),),
+        start_after=("path 1",), stop_after=("shoot 1",)
     ),
-    WaitCommand(0.05),
-    ParallelCommandGroup(
-        SequentialCommandGroup(
-            rotate_1,
-            IndexOn().alongWith(InstantCommand(Robot.index.dinglebobs_in, Robot.intake))
-        ),
-        ShooterEnableAtDistance(Robot.shooter, 2.4) # Was 2.7s
-    ).withTimeout(1.5),
-    InstantCommand(right_intake_off, Robot.intake),
-    IndexOff(), InstantCommand(Robot.index.dinglebobs_off, Robot.index),
-    ParallelCommandGroup(
-        second_path,
-        InstantCommand(left_intake_on, Robot.intake)
+    AutoStep(
+        "shoot 1", feed(0.7), after=("path 1",),
+        when=(flywheels_ready,), max_wait=constants.auto_spin_up_time, estimate=0.7
     ),
-    WaitCommand(0.1),
-    ParallelCommandGroup(
-        SequentialCommandGroup(
-            ParallelCommandGroup(
-                rotate_2,
-                WaitCommand(0.5).andThen(InstantCommand(left_intake_off, Robot.intake)),
-            ),
-            IndexOn().alongWith(InstantCommand(lambda: Robot.index.dinglebobs_in(), Robot.intake))
-        ),
-        ShooterEnableAtDistance(Robot.shooter, 2.8) # CHANGED FROM 3.1 - SID JUN 3 2022
-    ).withTimeout(1.5),
-    IndexOff(), InstantCommand(lambda: Robot.index.dinglebobs_off(), Robot.index),
-    ParallelCommandGroup(
-        third_path,
-        InstantCommand(left_intake_on, Robot.intake)
+    AutoStep("right intake off", InstantCommand(right_intake_off, Robot.intake), after=("shoot 1",)),
+    AutoStep("path 2", second_path, after=("shoot 1",), estimate=second_path.duration),
+    AutoStep("left intake on", InstantCommand(left_intake_on, Robot.intake), after=("right intake off",)),
+    AutoStep(
+        "spin up 2", ShooterEnableAtDistance(Robot.shooter, 2.8), # CHANGED FROM 3.1 - SID JUN 3 2022
+        after=("shoot 1",), when=(pose_within(second_path_end_pose.as_pose(), constants.auto_spin_up_distance),),
+        start_after=("path 2",), stop_after=("shoot 2",)
     ),
-    InstantCommand(Robot.drivetrain.stop, Robot.drivetrain),
-    WaitCommand(1.5),
-    # WaitCommand(1),
-    # ParallelCommandGroup(
-    #     SequentialCommandGroup(
-    #         ParallelCommandGroup(
-    #             WaitCommand(0.5).andThen(InstantCommand(left_intake_off, Robot.intake)),
-    #             rotate_3,
-    #         ),
-    #         IndexOn().alongWith(InstantCommand(lambda: Robot.index.dinglebobs_in(), Robot.intake)),
-    #     ),
-    #     ShooterEnableAtDistance(Robot.shooter, (23.5 * ft - 8 * inch).asNumber(m))
-    # ).withTimeout(2),
-    # IndexOff(), InstantCommand(lambda: Robot.index.dinglebobs_off(), Robot.intake),
-    ParallelCommandGroup(
-        SequentialCommandGroup(
-            fourth_path,
-            InstantCommand(rezero),
-            IndexOn().alongWith(InstantCommand(lambda: Robot.index.dinglebobs_in(), Robot.intake))
-        ),
-        ShooterEnableAtDistance(Robot.shooter, 2.7), # Was 3
-        WaitCommand(1).andThen(InstantCommand(left_intake_off)),
-    )
-)
+    AutoStep(
+        "left intake off", InstantCommand(left_intake_off, Robot.intake), after=("path 2",),
+        when=(ball_staged,), max_wait=0.5
+    ),
+    AutoStep(
+        "shoot 2", feed(1), after=("left intake off",),
+        when=(flywheels_ready,), max_wait=constants.auto_spin_up_time, estimate=1
+    ),
+    AutoStep("path 3", third_path, after=("shoot 2",), estimate=third_path.duration),
+    AutoStep("left intake on 3", InstantCommand(left_intake_on, Robot.intake), after=("shoot 2",)),
+    AutoStep("stop", InstantCommand(Robot.drivetrain.stop, Robot.drivetrain), after=("path 3",)),
+    # Time for the human player ball, nothing senses the second ball in the index
+    AutoStep("terminal", WaitCommand(1.5), after=("stop",), estimate=1.5),
+    AutoStep("path 4", fourth_path, after=("terminal",), estimate=fourth_path.duration),
+    AutoStep("spin up 3", ShooterEnableAtDistance(Robot.shooter, 2.7), after=("terminal",), stop_after=("shoot 3",)), # Was 3
+    AutoStep("left intake off 3", WaitCommand(1).andThen(InstantCommand(left_intake_off)), after=("terminal",)),
+    AutoStep("rezero", InstantCommand(rezero), after=("path 4",)),
+    AutoStep(
+        "shoot 3", feed(1), after=("rezero",),
+        when=(flywheels_ready,), max_wait=constants.auto_spin_up_time, estimate=1
+    ),
+])
 
 routine = AutoRoutine(initial_robot_pose, final_command)
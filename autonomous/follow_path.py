@@ -9,10 +9,19 @@ from wpimath.controller import HolonomicDriveController, PIDController, Profiled
 from wpimath.geometry import Rotation2d
 from wpimath.trajectory import Trajectory, TrapezoidProfileRadians
 
+from autonomous.trajectory import HolonomicTrajectory
+
 
 class FollowPathCustom(SubsystemCommand[SwerveDrivetrain]):
-    def __init__(self, subsystem: SwerveDrivetrain, trajectory: Trajectory, theta_f: radians, period: float = 0.02):
+    def __init__(self, subsystem: SwerveDrivetrain, trajectory: Trajectory | HolonomicTrajectory,
+                 theta_f: radians = None, period: float = 0.02):
+        '''
+        :Param trajectory: a HolonomicTrajectory turns the robot along its own heading profile,
+        a plain Trajectory turns it at a constant rate to theta_f over the whole path
+        '''
         super().__init__(subsystem)
+        if theta_f is None:
+            theta_f = trajectory.end_heading
         self.trajectory = trajectory
         self.controller = HolonomicDriveController(
             PIDController(1, 0, 0, period),
@@ -35,7 +44,7 @@ class FollowPathCustom(SubsystemCommand[SwerveDrivetrain]):
 
     def initialize(self) -> None:
         self.start_time = time.perf_counter()
-        self.theta_i = self.subsystem.odometry.getPose().rotation().radians()
+        self.theta_i = self.subsystem.get_pose().rotation().radians()
         self.theta_diff = bounded_angle_diff(self.theta_i, self.theta_f)
         self.omega = self.theta_diff / self.duration
         self.finished = False
@@ -46,13 +55,21 @@ class FollowPathCustom(SubsystemCommand[SwerveDrivetrain]):
             self.t = self.duration
             self.finished = True
         goal = self.trajectory.sample(self.t)
-        goal_theta = self.theta_i + self.omega * self.t
-        speeds = self.controller.calculate(self.subsystem.odometry.getPose(), goal, Rotation2d(goal_theta))
+        omega_ff = 0
+        if isinstance(self.trajectory, HolonomicTrajectory):
+            # The planned heading, plus however far off it the robot started, worked off by the end
+            start_error = bounded_angle_diff(self.trajectory.start_heading, self.theta_i)
+            goal_theta = self.trajectory.heading(self.t) + start_error * (1 - self.trajectory.progress(self.t))
+            # The plan is in real rad/s, the drivetrain's kinematics turn faster than they're told
+            omega_ff = self.subsystem.swerve_kinematics.commanded_omega(self.trajectory.omega(self.t))
+        else:
+            goal_theta = self.theta_i + self.omega * self.t
+        speeds = self.controller.calculate(self.subsystem.get_pose(), goal, Rotation2d(goal_theta))
         vx, vy = rotate_vector(
             speeds.vx, speeds.vy,
-            self.subsystem.odometry.getPose().rotation().radians()
+            self.subsystem.get_pose().rotation().radians()
         )
-        self.subsystem.set((vx, vy), speeds.omega)
+        self.subsystem.set((vx, vy), speeds.omega + omega_ff)
         # self.subsystem.set((vx, vy), 0 * rad/s)
 
     def end(self, interrupted: bool) -> None:
@@ -90,7 +107,7 @@ class RotateInPlace(SubsystemCommand[SwerveDrivetrain]):
     def initialize(self) -> None:
         logger.info(f"rotating")
         self.start_time = time.perf_counter()
-        self.theta_i = self.subsystem.odometry.getPose().rotation().radians()
+        self.theta_i = self.subsystem.get_pose().rotation().radians()
         self.theta_diff = bounded_angle_diff(self.theta_i, self.theta_f)
         self.omega = self.theta_diff / self.duration
         self.finished = False
@@ -100,7 +117,7 @@ class RotateInPlace(SubsystemCommand[SwerveDrivetrain]):
         if self.t > self.duration:
             self.t = self.duration
             self.finished = True
-        goal = self.subsystem.odometry.getPose()
+        goal = self.subsystem.get_pose()
         goal_theta = self.theta_i + self.omega * self.t
         speeds = self.controller.calculate(goal, goal, 0, Rotation2d(goal_theta))
         self.subsystem.set((0, 0), speeds.omega)
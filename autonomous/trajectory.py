@@ -1,10 +1,16 @@
+import bisect
+import math
 from dataclasses import dataclass
 
 from robotpy_toolkit_7407.unum import Unum
+from robotpy_toolkit_7407.utils import logger
+from robotpy_toolkit_7407.utils.math import bounded_angle_diff
 from robotpy_toolkit_7407.utils.units import m, rad, s
 from wpimath.geometry import Pose2d, Translation2d
 from wpimath.trajectory import TrajectoryGenerator, TrajectoryConfig, Trajectory
 
+import constants
+
 
 # def translation(x: Unum, y: Unum) -> Translation2d:
 #     return Translation2d(x.asNumber(m), y.asNumber(m))
@@ -42,3 +48,221 @@ def generate_trajectory_from_pose(start: Pose2d, waypoints: list[Translation2d],
     config.setStartVelocity(0)
     config.setEndVelocity(end.vel.asNumber(m/s))
     return TrajectoryGenerator.generateTrajectory(start, waypoints, end.as_pose(), config)
+
+
+@dataclass
+class PathConstraints:
+    '''
+    Limits a planned path is held to, the defaults are what the drivetrain can actually do
+    '''
+    max_vel: float = constants.auto_max_vel  # m/s
+    max_accel: float = constants.auto_max_accel  # m/s^2, tangential and centripetal together
+    max_centripetal_accel: float = constants.auto_max_centripetal_accel  # m/s^2, never more than max_accel
+    max_module_vel: float = constants.drivetrain_max_module_vel  # m/s, translation plus rotation at the module
+    max_angular_vel: float = constants.drivetrain_max_angular_vel  # rad/s
+    max_angular_accel: float = constants.auto_max_angular_accel  # rad/s^2
+
+
+class HolonomicTrajectory:
+    '''
+    A path with the heading profiled along it. The heading turns in step with distance travelled,
+    so the rotation shares the module speed with the translation instead of needing its own time.
+    Between headings fixed at waypoints it turns at a constant rate per meter.
+    '''
+
+    def __init__(self, trajectory: Trajectory, headings: list[tuple[float, float]], segment_times: list[float]):
+        '''
+        :Param list headings: (fraction of the path distance, heading in rad) knots from start to end,
+        unwrapped so each step is the turn to take
+
+        :Param list segment_times: seconds spent between each pair of waypoints
+        '''
+        self.trajectory = trajectory
+        self.headings = headings
+        self.start_heading = headings[0][1]
+        self.end_heading = headings[-1][1]
+        self.segment_times = segment_times
+
+        states = trajectory.states()
+        self.times = [state.t for state in states]
+        self.progress_table = [0.0]
+        for a, b in zip(states, states[1:]):
+            self.progress_table.append(self.progress_table[-1] + a.pose.translation().distance(b.pose.translation()))
+        self.length = self.progress_table[-1]
+        self.progress_table = [d / self.length for d in self.progress_table]
+
+    def totalTime(self) -> float:
+        return self.trajectory.totalTime()
+
+    def sample(self, t: float) -> Trajectory.State:
+        return self.trajectory.sample(t)
+
+    def progress(self, t: float) -> float:
+        '''
+        Fraction of the path distance covered at time t, 0 to 1
+        '''
+        i = bisect.bisect_right(self.times, t)
+        if i <= 0:
+            return 0.0
+        if i >= len(self.times):
+            return 1.0
+        t0, t1 = self.times[i - 1], self.times[i]
+        p0, p1 = self.progress_table[i - 1], self.progress_table[i]
+        return p0 + (p1 - p0) * (t - t0) / (t1 - t0)
+
+    def _knot(self, p: float) -> int:
+        # Index of the heading knot that starts the piece p is on
+        return min(max(bisect.bisect_right([k[0] for k in self.headings], p) - 1, 0), len(self.headings) - 2)
+
+    def heading(self, t: float) -> float:
+        # Planned heading (rad) at time t
+        p = self.progress(t)
+        i = self._knot(p)
+        (p0, h0), (p1, h1) = self.headings[i], self.headings[i + 1]
+        return h0 + (h1 - h0) * (p - p0) / (p1 - p0) if p1 > p0 else h1
+
+    def omega(self, t: float) -> float:
+        # Planned angular velocity (rad/s), feedforward for the heading controller
+        i = self._knot(self.progress(t))
+        (p0, h0), (p1, h1) = self.headings[i], self.headings[i + 1]
+        if p1 <= p0:
+            return 0.0
+        return self.trajectory.sample(t).velocity * (h1 - h0) / ((p1 - p0) * self.length)
+
+
+def point_before_end(start: Pose2d, end: Pose2d, distance: float) -> Translation2d:
+    '''
+    Point on the spline from start to end, distance (m) back along it from the end. Used as a waypoint
+    it barely changes the path's shape, so a heading can be fixed there without a detour
+    '''
+    states = TrajectoryGenerator.generateTrajectory(start, [], end, TrajectoryConfig(1, 1)).states()
+    travelled = 0.0
+    for a, b in zip(reversed(states[:-1]), reversed(states[1:])):
+        travelled += a.pose.translation().distance(b.pose.translation())
+        if travelled >= distance:
+            return a.pose.translation()
+    return states[0].pose.translation()
+
+
+def generate_holonomic_trajectory(start: Pose2d, waypoints: list[Translation2d], end: Pose2d,
+                                  start_heading: float, end_heading: float,
+                                  constraints: PathConstraints = None,
+                                  segment_max_vel: list[float | None] = None,
+                                  segment_max_time: list[float | None] = None,
+                                  waypoint_headings: list[float | None] = None) -> HolonomicTrajectory:
+    '''
+    Plans the fastest trajectory through the waypoints that turns the robot from start_heading to
+    end_heading on the way, without going past any module's speed, the centripetal acceleration
+    or the per segment limits.
+
+    :Param Pose2d start: start position, the rotation is the direction of travel, not the heading
+
+    :Param Pose2d end: end position and direction of travel
+
+    :Param float start_heading: robot heading the path is planned from (rad)
+
+    :Param float end_heading: robot heading at the end of the path (rad)
+
+    :Param list segment_max_vel: speed limit (m/s) for each stretch between waypoints, None for no extra limit
+
+    :Param list segment_max_time: seconds each stretch is expected to take, logs a warning if the plan is slower
+
+    :Param list waypoint_headings: heading (rad) the robot has to have at each waypoint, None to leave it free
+    '''
+    if constraints is None:
+        constraints = PathConstraints()
+    segments = len(waypoints) + 1
+    segment_max_vel = segment_max_vel or [None] * segments
+    segment_max_time = segment_max_time or [None] * segments
+    waypoint_headings = waypoint_headings or [None] * len(waypoints)
+
+    # Spline the path with wpimath, only its shape is kept
+    config = TrajectoryConfig(constraints.max_vel, constraints.max_accel)
+    states = TrajectoryGenerator.generateTrajectory(start, waypoints, end, config).states()
+
+    distances = [0.0]
+    for a, b in zip(states, states[1:]):
+        distances.append(distances[-1] + a.pose.translation().distance(b.pose.translation()))
+    length = distances[-1]
+
+    # Which stretch between waypoints each state is on, the spline passes through every waypoint
+    segment_of = []
+    waypoint_distances = []
+    segment = 0
+    for state, d in zip(states, distances):
+        segment_of.append(segment)
+        if segment < len(waypoints) and state.pose.translation().distance(waypoints[segment]) < 1e-4:
+            waypoint_distances.append(d)
+            segment += 1
+
+    # Heading knots (distance, heading), unwrapped so each piece takes the short way round
+    knots = [(0.0, start_heading)]
+    for d, heading in zip(waypoint_distances, waypoint_headings):
+        if heading is not None:
+            knots.append((d, knots[-1][1] + bounded_angle_diff(knots[-1][1], heading)))
+    knots.append((length, knots[-1][1] + bounded_angle_diff(knots[-1][1], end_heading)))
+
+    def turn_rate_at(d):
+        # Heading change per meter (rad/m), the faster piece where two meet at a knot
+        rates = [abs(h1 - h0) / (d1 - d0) for (d0, h0), (d1, h1) in zip(knots, knots[1:])
+                 if d1 > d0 and d0 - 1e-9 <= d <= d1 + 1e-9]
+        return max(rates, default=0.0)
+
+    turn_rates = [turn_rate_at(d) for d in distances]
+    # Real lever arm of the square module layout, the feedforward is scaled so the robot turns at the planned rate
+    r = constants.track_width * math.sqrt(2) / 2
+    # Past max_accel max_accel() below would have nothing left along the path
+    centripetal_accel = min(constraints.max_centripetal_accel, constraints.max_accel)
+
+    # Fastest each state can be taken on its own
+    limits = []
+    for state, seg, turn_rate in zip(states, segment_of, turn_rates):
+        limit = min(constraints.max_vel, constraints.max_module_vel / (1 + turn_rate * r))
+        if turn_rate > 0:
+            limit = min(limit, constraints.max_angular_vel / turn_rate)
+        if abs(state.curvature) > 1e-6:
+            limit = min(limit, math.sqrt(centripetal_accel / abs(state.curvature)))
+        if segment_max_vel[seg] is not None:
+            limit = min(limit, segment_max_vel[seg])
+        limits.append(limit)
+
+    def max_accel(v, curvature, turn_rate):
+        # What's left of the acceleration after the centripetal part, and what the heading can take
+        centripetal = v * v * abs(curvature)
+        a = math.sqrt(max(constraints.max_accel ** 2 - centripetal ** 2, 0))
+        if turn_rate > 0:
+            a = min(a, constraints.max_angular_accel / turn_rate)
+        return a
+
+    # Forward pass accelerating from rest, backward pass decelerating to rest
+    velocities = [0.0] * len(states)
+    for i in range(1, len(states)):
+        ds = distances[i] - distances[i - 1]
+        a = max_accel(velocities[i - 1], states[i - 1].curvature, max(turn_rates[i - 1], turn_rates[i]))
+        velocities[i] = min(limits[i], math.sqrt(velocities[i - 1] ** 2 + 2 * a * ds))
+    velocities[-1] = 0.0
+    for i in range(len(states) - 2, -1, -1):
+        ds = distances[i + 1] - distances[i]
+        a = max_accel(velocities[i + 1], states[i + 1].curvature, max(turn_rates[i], turn_rates[i + 1]))
+        velocities[i] = min(velocities[i], math.sqrt(velocities[i + 1] ** 2 + 2 * a * ds))
+
+    planned = []
+    segment_times = [0.0] * segments
+    t = 0.0
+    for i, state in enumerate(states):
+        if i > 0:
+            ds = distances[i] - distances[i - 1]
+            v_sum = velocities[i] + velocities[i - 1]
+            if ds > 0 and v_sum <= 0:
+                raise ValueError("path can't be driven within its constraints")
+            dt = 2 * ds / v_sum if ds > 0 else 0.0
+            planned[-1].acceleration = (velocities[i] - velocities[i - 1]) / dt if dt > 0 else 0.0
+            t += dt
+            segment_times[segment_of[i - 1]] += dt
+        planned.append(Trajectory.State(t, velocities[i], 0.0, state.pose, state.curvature))
+
+    for seg, (planned_time, max_time) in enumerate(zip(segment_times, segment_max_time)):
+        if max_time is not None and planned_time > max_time:
+            logger.warn(f"path segment {seg} takes {planned_time:.2f}s, over its {max_time:.2f}s limit")
+
+    return HolonomicTrajectory(Trajectory(planned), [(d / length, h) for d, h in knots], segment_times)
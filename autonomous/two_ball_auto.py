@@ -1,16 +1,17 @@
 import math
 
-from commands2 import SequentialCommandGroup, ParallelCommandGroup, InstantCommand, WaitCommand, ParallelDeadlineGroup
+from commands2 import InstantCommand, WaitUntilCommand
 from robotpy_toolkit_7407.utils.units import m, rad, deg, s, inch
 from wpimath.geometry import Pose2d
 
 import constants
 from autonomous.auto_routine import AutoRoutine
+from autonomous.auto_scheduler import AutoScheduler, AutoStep, flywheels_ready
 from autonomous.follow_path import FollowPathCustom, RotateInPlace
 from autonomous.trajectory import TrajectoryEndpoint, generate_trajectory, generate_trajectory_without_unum
 from command import IndexOn, IndexOff
 from command.shooter import TurretAim
-from robot_systems import Robot
+from robot_systems import Robot, Sensors
 
 
 initial_robot_pose = Pose2d(4.9, -2.5, -45 * deg)
@@ -75,23 +76,40 @@ def turn_turret_towards():
     Robot.shooter.set_turret_angle(3.2)
 
 
-# final auto sequence
-final_command = SequentialCommandGroup(
-    InstantCommand(resetGyro),
-    InstantCommand(zero),
-    InstantCommand(right_intake_on),
-    ParallelDeadlineGroup(
-        SequentialCommandGroup(
-            first_path,
-            InstantCommand(dinglebob_shoot),
-            WaitCommand(3)
-        ),
-        TurretAim(Robot.shooter)
+def shoot(balls: int, timeout: float):
+    '''
+    Feeds until the shot detector counts every ball out, instead of always waiting out the timeout
+
+    :Param int balls: shots to wait for
+    :Param float timeout: seconds to wait before moving on anyway
+    '''
+    fired_before = []
+
+    def start():
+        fired_before[:] = [Sensors.shots.shots]
+        dinglebob_shoot()
+
+    return InstantCommand(start).andThen(
+        WaitUntilCommand(lambda: Sensors.shots.shots - fired_before[0] >= balls).withTimeout(timeout)
+    )
+
+
+# Each step starts as soon as what it's after is done and its conditions hold
+final_command = AutoScheduler([
+    AutoStep("reset gyro", InstantCommand(resetGyro)),
+    AutoStep("zero", InstantCommand(zero), after=("reset gyro",)),
+    AutoStep("right intake on", InstantCommand(right_intake_on), after=("zero",)),
+    AutoStep("path 1", first_path, after=("right intake on",), estimate=first_path.duration),
+    # Aims and spins up off vision while the path is still driving
+    AutoStep("aim", TurretAim(Robot.shooter), after=("right intake on",), stop_after=("shoot",)),
+    AutoStep(
+        "shoot", shoot(2, 3), after=("path 1",),
+        when=(flywheels_ready,), max_wait=constants.auto_spin_up_time, estimate=1
     ),
-    InstantCommand(gyro_rezero),
-    InstantCommand(right_intake_off),
-    InstantCommand(left_dinglebob_off),
-    InstantCommand(right_dinglebob_off)
-)
+    AutoStep("gyro rezero", InstantCommand(gyro_rezero), after=("shoot",)),
+    AutoStep("right intake off", InstantCommand(right_intake_off), after=("shoot",)),
+    AutoStep("left dinglebob off", InstantCommand(left_dinglebob_off), after=("shoot",)),
+    AutoStep("right dinglebob off", InstantCommand(right_dinglebob_off), after=("shoot",)),
+])
 
 routine = AutoRoutine(initial_robot_pose, final_command)
\ No newline at end of file
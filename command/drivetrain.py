@@ -9,18 +9,12 @@ from wpimath.controller import ProfiledPIDControllerRadians
 from wpimath.trajectory import TrapezoidProfileRadians
 
 import constants
+from oi.drive_input import DriveInput
 from robot_systems import Robot
 from subsystem import Drivetrain, Shooter
 
-
-def curve_abs(x):
-    return x ** 2.4
-
-
-def curve(x):
-    if x < 0:
-        return -curve_abs(-x)
-    return curve_abs(x)
+# Shared by every drive command so switching between them doesn't jump past the slew limit
+drive_input = DriveInput()
 
 
 AIM_kP = 3.5
@@ -38,16 +32,10 @@ class DriveSwerveCustom(SubsystemCommand[Drivetrain]):
         pass
 
     def execute(self) -> None:
-        dx, dy, d_theta = self.subsystem.axis_dx.value, self.subsystem.axis_dy.value, -self.subsystem.axis_rotation.value
-
-        if abs(d_theta) < 0.15:
-            d_theta = 0
-
-        dx = curve(dx)
-        dy = curve(dy)
-        d_theta = curve(d_theta)
+        dx, dy, d_theta = drive_input.shape(
+            self.subsystem.axis_dx.value, self.subsystem.axis_dy.value, -self.subsystem.axis_rotation.value
+        )
 
-        # TODO normalize this to circle somehow
         dx *= self.subsystem.max_vel
         dy *= -self.subsystem.max_vel
 
@@ -59,10 +47,7 @@ class DriveSwerveCustom(SubsystemCommand[Drivetrain]):
             self.subsystem.set((dx, dy), d_theta * self.subsystem.max_angular_vel)
 
     def end(self, interrupted: bool) -> None:
-        self.subsystem.n_00.set(0, 0)
-        self.subsystem.n_01.set(0, 0)
-        self.subsystem.n_10.set(0, 0)
-        self.subsystem.n_11.set(0, 0)
+        self.subsystem.stop()
 
     def isFinished(self) -> bool:
         return False
@@ -94,7 +79,7 @@ class DriveSwerveTurretAim(SubsystemCommand[Drivetrain]):
     def execute(self) -> None:
         print("Running DriveSwerveTurretAim.")
 
-        dx, dy = Robot.drivetrain.axis_dx.value, Robot.drivetrain.axis_dy.value
+        dx, dy, _ = drive_input.shape(Robot.drivetrain.axis_dx.value, Robot.drivetrain.axis_dy.value)
         current_limelight_offset = Robot.limelight.table.getNumber('tx', None)
 
         if current_limelight_offset is not None and current_limelight_offset != 0 and abs(current_limelight_offset < 2):
@@ -152,22 +137,19 @@ class ShootWhileMoving(Command):
 
     def execute(self) -> None:
         hub_angle = Robot.odometry.hub_angle
-        dx, dy = self.drivetrain.axis_dx.value, self.drivetrain.axis_dy.value
+        dx, dy, _ = drive_input.shape(self.drivetrain.axis_dx.value, self.drivetrain.axis_dy.value)
 
         robot_dist = Robot.odometry.hub_dist
         if robot_dist is None:
             robot_dist = 2
 
-        robot_vel = Robot.drivetrain.chassis_speeds.vx, Robot.drivetrain.chassis_speeds.vy
+        snapshot = Robot.drivetrain.snapshot
+        robot_vel = snapshot.vx, snapshot.vy
 
         target_angle, should_shoot = self.shooter.target_with_motion(robot_dist - 0.2, hub_angle, robot_vel)
 
         omega = self.pid_controller.calculate(target_angle, 0)
 
-        dx = curve(dx)
-        dy = curve(dy)
-
-        # TODO normalize this to circle somehow
         dx *= constants.drivetrain_target_max_vel
         dy *= -constants.drivetrain_target_max_vel
 
@@ -194,7 +176,7 @@ class ShootWhileMoving(Command):
         if finished:
             commands2.CommandScheduler.getInstance().schedule(DriveSwerveCustom(Robot.drivetrain))
             Robot.shooter.ready = False
-            if not Robot.index.photo_electric.get_value():
+            if not Robot.index.photo_electric.value:
                 Robot.index.ball_queue = 0
                 Robot.index.refresh = True
         return finished
@@ -34,7 +34,7 @@ class IndexAutoDrive(SubsystemCommand):
     def execute(self):
         speed = 0
 
-        if self.subsystem.photo_electric.get_value():
+        if self.subsystem.photo_electric.value:
             match self.subsystem.ball_queue:
                 case 0:
                     if self.done:
@@ -26,10 +26,9 @@ class IntakeAutoEject(SubsystemCommand):
         if Robot.index.ball_queue == 2:
             self.subsystem.dinglebobs_off()
         elif self.subsystem.left_intake_down:
-            left_color = Sensors.color_sensors.color()
-            #print("Lefty: ", Sensors.color_sensors.get_val())
+            left_color = Sensors.color_sensors.left_color()
+            #print("Lefty: ", Sensors.color_sensors.left_val())
             #print("Left Color:", left_color)
-            Sensors.color_sensors.multiplexer.writeBulk(bytes([0b0100])) #0100 = Left
 
             if left_color != config.TEAM and left_color != "none":
                 self.ejecting = True
@@ -47,10 +46,9 @@ class IntakeAutoEject(SubsystemCommand):
                 self.subsystem.dinglebobs_in()
 
         elif self.subsystem.right_intake_down:
-            right_color = Sensors.color_sensors.color()
-            #print("Righty: ", Sensors.color_sensors.get_val())
+            right_color = Sensors.color_sensors.right_color()
+            #print("Righty: ", Sensors.color_sensors.right_val())
             #print("Right Color:", right_color)
-            Sensors.color_sensors.multiplexer.writeBulk(bytes([0b1000]))
 
             if right_color != config.TEAM and right_color != "none":
                 self.ejecting = True
@@ -67,7 +65,7 @@ class IntakeAutoEject(SubsystemCommand):
             else:
                 self.subsystem.dinglebobs_in()
         elif not Robot.index.running:
-            if not Robot.index.photo_electric.get_value():
+            if not Robot.index.photo_electric.value:
                 if Robot.intake.dinglebobs_extra:
                     commands2.CommandScheduler.getInstance().schedule(commands2.WaitCommand(.5).andThen(commands2.InstantCommand(self.subsystem.dinglebobs_off)))
                     Robot.intake.dinglebobs_extra = False
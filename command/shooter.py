@@ -15,6 +15,7 @@ import math
 from wpimath.controller import ProfiledPIDControllerRadians
 from wpimath.trajectory import TrapezoidProfileRadians
 import constants
+from utils.turret_tracking import TurretTracker, TurretPlanner
 
 from command.drivetrain import DriveSwerveCustom
 import commands2
@@ -105,10 +106,7 @@ class TurretZero(SubsystemCommand[Shooter]):
 class TurretAim(SubsystemCommand[Shooter]):
     def __init__(self, subsystem: Shooter):
         super().__init__(subsystem)
-        self.power = 0
-
-        self.min_absolute_power = constants.min_turret_power  # Minimum power of turret required to move it
-        self.max_absolute_power = constants.max_turret_power  # Maximum movement power of turret allowed .80
+        self.tracker = TurretTracker()  # Turret velocity from the limelight offset and the robot's motion
 
         # Soft limits for turret movement
         self.limit_backward = False
@@ -116,29 +114,58 @@ class TurretAim(SubsystemCommand[Shooter]):
 
         self.default_movement_power = constants.default_turret_power  # Default movement power of turret if not using pid
 
-        self.p = .02  # Multiplies current offset by this multiplier to get power .0275
-
         self.min_angle = 0 + 10  # Minimum angle of turret range
         self.max_angle = self.subsystem.turret_max_angle - 10  # Maximum angle of turret range
-
-        self.limelight_angle_threshold = 2  # Angle threshold for limelight to be considered on target
+        self.planner = TurretPlanner(self.min_angle, self.max_angle)  # Which way round to reach the hub
 
         self.limelight_detected_counts = 0  # Counts how many times limelight has detected target in a row
 
         self.current_shooter_angle = 0
 
+        self.last_distance = None  # Last hub distance from vision
+        self.last_vision_time = None
+
     def initialize(self) -> None:
-        pass
+        self.tracker.reset()
+        self.planner.reset()
+
+    def spin_up_distance(self):
+        '''
+        Distance to keep the flywheels and hood set for while vision isn't locked, None to spin down
+
+        Holds the last vision distance through short dropouts, then uses the odometry distance once it's
+        been corrected by the limelight since the drivetrain was rezeroed. A stale vision distance past
+        the hold isn't used, the wheels spin down instead
+        '''
+        if self.subsystem.target_turret_dist is not None:
+            return self.subsystem.target_turret_dist
+        if not constants.shooter_prespin:
+            return None
+        now = wpilib.Timer.getFPGATimestamp()
+        if self.last_distance is not None and now - self.last_vision_time < constants.shooter_dropout_hold:
+            return self.last_distance
+        if Robot.odometry.hub_dist is not None and self.subsystem.seen_after_drivetrain_rezero:
+            return Robot.odometry.hub_dist
+        return None
+
+    def plan_turret_angle(self, target: float, current: float) -> float:
+        # Degrees, rate and velocity in the turret's direction
+        return self.planner.plan(
+            target, current,
+            math.degrees(self.subsystem.get_turret_rotation_velocity()),
+            math.degrees(self.tracker.feedforward)
+        )
 
     def is_shooter_ready(self):
         m_top_desired = self.subsystem.desired_m_top
         m_bottom_desired = self.subsystem.desired_m_bottom
 
+        # Ready a feed time before the flywheels are predicted to be in tolerance, so the ball gets there as they do
         return (
-                self.limelight_detected_counts > 6
-                and abs(Robot.shooter.m_top.get_sensor_velocity() - m_top_desired) < .05 * m_top_desired
-                and abs(Robot.shooter.m_bottom.get_sensor_velocity() - m_bottom_desired) < .05 * m_bottom_desired
-                and abs(Robot.drivetrain.chassis_speeds.omega) < 0.1
+                self.tracker.locked
+                and m_top_desired > 0 and m_bottom_desired > 0
+                and Robot.feed_scheduler.should_feed(wpilib.Timer.getFPGATimestamp())
+                and abs(Robot.drivetrain.snapshot.omega) < 0.1
         )
 
     def execute(self) -> None:
@@ -184,45 +211,37 @@ class TurretAim(SubsystemCommand[Shooter]):
                     true_angle)  # constant for lower turret
                 wpilib.SmartDashboard.putNumber("Distance to Hub", distance)
                 if self.limelight_detected_counts >= 3:
+                    self.last_distance = distance
+                    self.last_vision_time = wpilib.Timer.getFPGATimestamp()
                     if self.subsystem.target_turret_dist is None:
                         self.subsystem.target_stationary(distance)
                     else:
                         self.subsystem.target_stationary(self.subsystem.target_turret_dist)
+                elif (spin_up_distance := self.spin_up_distance()) is not None:
+                    # Not trusting the new distance yet, stay spun up instead of starting over
+                    self.subsystem.target_stationary(spin_up_distance)
                 else:
                     self.subsystem.stop()
 
-                if abs(current_offset) > self.limelight_angle_threshold:
-                    self.subsystem.ready = False
-
-                    self.power = abs(current_offset * self.p)
-
-                    if current_offset > 0:
-                        if self.limit_forward:
-                            sign = 0
-                        else:
-                            sign = 1
-                    elif current_offset < 0:
-                        if self.limit_backward:
-                            sign = 0
-                        else:
-                            sign = -1
-                    else:
-                        sign = 0
-
-                    self.power = abs(max(min(self.power, self.max_absolute_power), self.min_absolute_power)) * sign
+                velocity = self.tracker.calculate(math.radians(current_offset), Robot.odometry.hub_bearing_rate())
 
-                    if self.subsystem.target_turret_angle is not None:
-                        desired_turret_angle = math.degrees(self.subsystem.target_turret_angle)
-                        Robot.shooter.set_turret_angle(
-                            math.radians(max(min(desired_turret_angle, self.max_angle), self.min_angle))
-                        )
+                if self.subsystem.target_turret_angle is not None:
+                    desired_turret_angle = math.degrees(self.subsystem.target_turret_angle)
+                    Robot.shooter.set_turret_angle(
+                        math.radians(max(min(desired_turret_angle, self.max_angle), self.min_angle))
+                    )
+                else:
+                    planned_angle = self.plan_turret_angle(current_angle + current_offset, current_angle)
+                    if self.planner.flipping:
+                        # Hub is (about to be) out of range, get to where it comes back in
+                        self.subsystem.set_turret_angle(math.radians(planned_angle))
                     else:
-                        self.subsystem.m_turret.set_raw_output(self.power)
+                        if (velocity > 0 and self.limit_forward) or (velocity < 0 and self.limit_backward):
+                            velocity = 0
+                        self.subsystem.set_turret_rotation_velocity(velocity)
 
-                    wpilib.SmartDashboard.putNumber("power", self.power)
-
-                else:
-                    self.subsystem.m_turret.set_raw_output(0)
+                wpilib.SmartDashboard.putNumber("turret_velocity", velocity)
+                wpilib.SmartDashboard.putNumber("turret_feedforward", self.tracker.feedforward)
 
                 self.subsystem.ready = self.is_shooter_ready()
 
@@ -235,21 +254,14 @@ class TurretAim(SubsystemCommand[Shooter]):
                     self.current_shooter_angle = self.subsystem.get_turret_rotation_angle()
 
                 Robot.odometry.update()
+                self.tracker.calculate(None, Robot.odometry.hub_bearing_rate())
 
                 if Robot.odometry.hub_angle is not None:
-                    if Robot.odometry.hub_dist is not None and self.subsystem.target_turret_dist is None \
-                            and self.subsystem.seen_after_drivetrain_rezero:
-                        self.subsystem.target_stationary(Robot.odometry.hub_dist)
-
                     hub_angle = math.degrees(Robot.odometry.hub_angle)
                     current_shooter_angle = math.degrees(self.current_shooter_angle)
 
-                    if hub_angle >= 0:
-                        desired_turret_angle = current_shooter_angle + hub_angle
-                    else:
-                        desired_turret_angle = current_shooter_angle + hub_angle + 360
-
-                    desired_turret_angle %= 360
+                    # Any turn of this works, the planner picks the one inside the soft limits
+                    desired_turret_angle = self.plan_turret_angle(current_shooter_angle + hub_angle, current_angle)
 
                     self.subsystem.desired_turret_angle = desired_turret_angle
 
@@ -264,8 +276,15 @@ class TurretAim(SubsystemCommand[Shooter]):
                         math.radians(max(min(desired_turret_angle, self.max_angle), self.min_angle))
                     )
 
-                if self.subsystem.target_turret_dist is not None:
-                    self.subsystem.target_stationary(self.subsystem.target_turret_dist)
+                spin_up_distance = self.spin_up_distance()
+                if spin_up_distance is None and Robot.odometry.hub_dist is not None \
+                        and self.subsystem.seen_after_drivetrain_rezero:
+                    # Without prespin the lost target still falls back to odometry, as it always did
+                    spin_up_distance = Robot.odometry.hub_dist
+                if spin_up_distance is not None:
+                    self.subsystem.target_stationary(spin_up_distance)
+                else:
+                    self.subsystem.stop()
 
         else:
             self.subsystem.m_turret.set_raw_output(-self.default_movement_power)
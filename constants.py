@@ -20,6 +20,30 @@ drivetrain_max_vel = (5 * mile/hour).asNumber(m/s) #20
 drivetrain_target_max_vel = (7 * mile/hour).asNumber(m/s)
 drivetrain_max_angular_vel = (2 * rev/s).asNumber(rad/s)
 drivetrain_max_climb_vel = (2 * mile/hour).asNumber(m/s)
+drive_deadband = .05  # radial stick deadband for translation
+drive_rotation_deadband = .15
+drive_curve_exponent = 2.4  # stick response, output = input ** exponent
+drive_rotation_curve_exponent = 2.4
+drive_slew_rate = 4  # full stick per second the shaped translation can change by
+drive_rotation_slew_rate = 8
+drivetrain_max_module_vel = 6380 * 2 * math.pi / 60 / drivetrain_move_gear_ratio  # falcon free speed at the wheel (m/s)
+
+swerve_angle_tolerance = math.radians(.5)  # module angle change too small to send
+swerve_velocity_tolerance = .01  # m/s, module speed change too small to send
+swerve_cosine_scaling = True  # slow a module down by how far it still has to turn
+swerve_flip_hysteresis = .15 * math.pi  # past 90 degrees before a module flips its drive direction (toolkit flipped at .65 pi)
+
+odometry_thread = True  # integrate odometry on its own notifier instead of when the drivetrain is set
+odometry_period = .005  # seconds, also the drive Talon / Pigeon2 feedback frame period while the thread runs (turn Talons stay at 20ms)
+
+# Limits autonomous.trajectory.generate_holonomic_trajectory plans paths to by default
+auto_max_vel = .85 * drivetrain_max_module_vel  # m/s, planned path speed, leaves the drive pid room to correct
+auto_max_accel = 5  # m/s^2, tangential and centripetal together
+auto_max_centripetal_accel = 4  # m/s^2
+auto_max_angular_accel = 4 * math.pi  # rad/s^2
+auto_spin_up_time = .4  # most seconds an auto shot waits on the flywheels after its path before feeding anyway
+auto_spin_up_distance = 1  # meters from the end of a path where auto starts spinning up for the shot there
+auto_pickup_turn_distance = .5  # meters at the end of a pickup path left to turn from the intake heading to the shooting one
 
 
 # --- SHOOTER ---
@@ -41,6 +65,13 @@ max_turret_power = .50
 min_turret_power = .07  # Minimum power required to move turret
 default_turret_power = .20  # Default power of turret
 max_turret_positional_velocity = 50000  # setting for positional pid of turret; max turret velocity
+turret_motion_cruise_velocity = 12000  # sensor units / 100ms, positional pid cruise velocity of the turret
+turret_tracking_kP = 6  # turret rad/s per rad of limelight offset, on top of the motion feedforward
+turret_max_velocity = 4  # rad/s of the turret itself
+turret_lock_threshold = 2  # degrees of limelight offset counted as on target
+turret_lock_ticks = 2  # ticks on target in a row before the turret is locked
+turret_direction = -1  # turret angle grows clockwise (a positive tx drives it positive)
+turret_min_flip_rate = 5  # deg/s the hub has to be moving around the robot before the turret flips ahead of it
 
 # Targeting constants
 air_resistance_constant = 0.048187
@@ -53,16 +84,28 @@ minimum_shooter_angle = math.pi / 4  # radians
 max_shooter_angle = math.radians(75)
 max_shooter_velocity = 15  # m/s #30
 limelight_horizontal_adjustment = .1 #.35
+shooter_prespin = True  # keep the flywheels spun up from odometry / the last vision distance while the target isn't locked
+shooter_dropout_hold = 1  # seconds the last vision distance is held through a dropout before falling back to odometry
 
 # --- INTAKE/INDEX ---
 
+pdh_left_intake_channel = 4 # PDH channels sampled by Sensors.power
+pdh_right_intake_channel = 3
+pdh_flywheel_channel = 11
+intake_stall_current = 10 # mean intake current (A) that means it's dragging a ball while the index is full
+intake_stall_samples = 3 # ticks averaged for intake stall detection
+
 dual_intakes_down = False #When True, enables Both Intakes to be down. WARNING, WILL mess up Ballpath logic system, expect to use operator manual controls
 default_intake_speed = 1 # as stated
 intake_current_sensing = False # Enables dragging balls while not actually intaking when full
 index_shooting_speed = .72 # shooting index speed
 default_index_speed = .7 # as stated
 index_intaking_speed = .7 # index speed when intaking ball
-index_photo_electric_threshold = 2 # the threshold check for the intake ball gereration #4 is sweet spot
+index_limit_debounce = .06 # seconds a side limit has to be pressed to count a new ball (was 2 ticks)
+index_limit_release_debounce = .06 # seconds a side limit has to be released before it can count another ball
+index_photo_electric_debounce = .1 # seconds the photo electric has to see a ball before it counts as staged
+index_shot_timeout = 1 # seconds after feeding a ball to the shooter it's taken as shot, if the shot detector didn't see it
+index_sensor_interrupts = False # Watch the index limits/photo electric with DIO interrupts, stops dinglebobs on the edge instead of the next tick
 # --- ELEVATOR ---
 
 elevator_gear_ratio = (20 * rev / (5.501 * inch)).asNumber(rad/m)
@@ -22,7 +22,7 @@ class OI:
 
         def reset_gyro():
             Robot.drivetrain.gyro.reset_angle()
-            Robot.drivetrain.odometry.resetPosition(Pose2d(0, 0, 0), Rotation2d(0))
+            Robot.drivetrain.reset_odometry(Pose2d(0, 0, 0), Rotation2d(0))
             Robot.shooter.seen_after_drivetrain_rezero = False
 
         Keymap.Drivetrain.RESET_GYRO().whenPressed(reset_gyro)
@@ -35,7 +35,7 @@ class OI:
 
         def zero_ball_queue():
             Robot.shooter.ready = False
-            if not Robot.index.photo_electric.get_value():
+            if not Robot.index.photo_electric.value:
                 Robot.index.ball_queue = 0
                 Robot.index.refresh = True
 
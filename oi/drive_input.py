@@ -0,0 +1,89 @@
+import math
+
+import constants
+
+
+class ResponseCurve:
+    '''
+    Stick response curve for inputs 0 to 1, evaluated once into a table and interpolated after that
+    '''
+
+    size = 256
+
+    def __init__(self, curve):
+        '''
+        :Param curve: function from 0-1 stick deflection to 0-1 output
+        '''
+        self.table = [curve(i / self.size) for i in range(self.size + 1)]
+
+    def __call__(self, x: float) -> float:
+        x = min(x, 1.0) * self.size
+        i = min(int(x), self.size - 1)
+        return self.table[i] + (self.table[i + 1] - self.table[i]) * (x - i)
+
+
+class DriveInput:
+    '''
+    Shapes the driver's sticks before they become drivetrain velocities:
+    radial deadband, clipped to the unit circle, response curve, then a slew rate limit.
+    One instance is shared by every drive command so the slew limit carries over when they switch.
+    '''
+
+    def __init__(self):
+        self.translation_curve = ResponseCurve(lambda x: x ** constants.drive_curve_exponent)
+        self.rotation_curve = ResponseCurve(lambda x: x ** constants.drive_rotation_curve_exponent)
+        self.translation_deadband = constants.drive_deadband
+        self.rotation_deadband = constants.drive_rotation_deadband
+        self.translation_slew = constants.drive_slew_rate * constants.period  # max change per tick
+        self.rotation_slew = constants.drive_rotation_slew_rate * constants.period
+
+        self.dx = 0.0
+        self.dy = 0.0
+        self.d_theta = 0.0
+
+    @staticmethod
+    def _deadband(magnitude: float, deadband: float) -> float:
+        # Rescaled so output starts from 0 at the edge of the deadband
+        if magnitude <= deadband:
+            return 0.0
+        return (min(magnitude, 1.0) - deadband) / (1 - deadband)
+
+    def shape(self, dx: float, dy: float, d_theta: float = 0.0) -> tuple[float, float, float]:
+        '''
+        Called once per tick
+
+        :Param float dx: raw x axis, -1 to 1
+
+        :Param float dy: raw y axis, -1 to 1
+
+        :Param float d_theta: raw rotation axis, -1 to 1
+
+        Returns shaped (dx, dy, d_theta), the translation is inside the unit circle
+        '''
+        magnitude = math.hypot(dx, dy)
+        shaped = self.translation_curve(self._deadband(magnitude, self.translation_deadband))
+        if shaped > 0:
+            target_x, target_y = dx / magnitude * shaped, dy / magnitude * shaped
+        else:
+            target_x = target_y = 0.0
+
+        rotation = self.rotation_curve(self._deadband(abs(d_theta), self.rotation_deadband))
+        target_theta = math.copysign(rotation, d_theta)
+
+        # Slew limit the translation as a vector so the direction doesn't bend while it ramps
+        step_x, step_y = target_x - self.dx, target_y - self.dy
+        step = math.hypot(step_x, step_y)
+        if step > self.translation_slew:
+            step_x *= self.translation_slew / step
+            step_y *= self.translation_slew / step
+        self.dx += step_x
+        self.dy += step_y
+
+        self.d_theta += max(min(target_theta - self.d_theta, self.rotation_slew), -self.rotation_slew)
+
+        return self.dx, self.dy, self.d_theta
+
+    def reset(self):
+        self.dx = 0.0
+        self.dy = 0.0
+        self.d_theta = 0.0
@@ -0,0 +1,97 @@
+import wpilib
+
+from oi.keymap import Controllers
+
+# Rumble patterns, list of (seconds, level) steps
+PATTERNS = {
+    "solid": [(1, 1)],
+    "index_full": [(.15, 1), (.1, 0), (.15, 1)],
+    "no_balls_aiming": [(.2, 1), (.2, 0)],
+}
+
+
+class Haptics:
+    '''
+    Owns the controllers used for rumble feedback. Commands ask for rumble by name, update() works out
+    the level for each controller and only sends it when it changes.
+    '''
+
+    rumble_type = wpilib.XboxController.RumbleType.kRightRumble
+
+    def __init__(self):
+        self.controllers = {
+            Controllers.DRIVER: wpilib.XboxController(Controllers.DRIVER),
+            Controllers.OPERATOR: wpilib.XboxController(Controllers.OPERATOR),
+        }
+        self.held = {}  # (controller, name) -> (pattern, start time), looped while held
+        self.playing = {}  # (controller, name) -> (pattern, start time), played once
+        self.conditions = {}  # (controller, name) -> last condition given to play_on
+        self.sent = {controller: None for controller in self.controllers}
+
+    def hold(self, controller: int, name: str, active: bool, pattern: str = "solid"):
+        '''
+        Loops a pattern for as long as active is True
+
+        :Param int controller: Controllers.DRIVER or Controllers.OPERATOR
+
+        :Param str name: what the rumble means, requests with different names don't interfere
+
+        :Param bool active: whether to rumble
+
+        :Param str pattern: key in PATTERNS
+        '''
+        key = (controller, name)
+        if not active:
+            self.held.pop(key, None)
+        elif key not in self.held or self.held[key][0] != pattern:
+            self.held[key] = (pattern, wpilib.Timer.getFPGATimestamp())
+
+    def play(self, controller: int, name: str, pattern: str):
+        # Plays a pattern once
+        self.playing[(controller, name)] = (pattern, wpilib.Timer.getFPGATimestamp())
+
+    def play_on(self, controller: int, name: str, condition: bool, pattern: str):
+        # Plays a pattern once each time condition turns True
+        key = (controller, name)
+        if condition and not self.conditions.get(key, False):
+            self.play(controller, name, pattern)
+        self.conditions[key] = condition
+
+    @staticmethod
+    def pattern_level(pattern: str, elapsed: float, loop: bool) -> float | None:
+        steps = PATTERNS[pattern]
+        length = sum(t for t, _ in steps)
+        if loop:
+            elapsed %= length
+        elif elapsed >= length:
+            return None
+        for t, level in steps:
+            if elapsed < t:
+                return level
+            elapsed -= t
+        return steps[-1][1]
+
+    def update(self):
+        # Called once per tick after the commands have run
+        now = wpilib.Timer.getFPGATimestamp()
+        levels = {controller: 0 for controller in self.controllers}
+
+        for (controller, name), (pattern, start) in self.held.items():
+            levels[controller] = max(levels[controller], self.pattern_level(pattern, now - start, True))
+
+        for key, (pattern, start) in list(self.playing.items()):
+            level = self.pattern_level(pattern, now - start, False)
+            if level is None:
+                del self.playing[key]
+            else:
+                levels[key[0]] = max(levels[key[0]], level)
+
+        for controller, level in levels.items():
+            if level != self.sent[controller]:
+                self.controllers[controller].setRumble(self.rumble_type, level)
+                self.sent[controller] = level
+
+    def stop(self):
+        self.held.clear()
+        self.playing.clear()
+        self.update()
@@ -14,13 +14,18 @@ from autonomous.auto_routine import AutoRoutine
 from command import BallPath
 from command import ElevatorRezero
 from command import TurretAim
-from command.drivetrain import DriveSwerveCustom
+from command.drivetrain import DriveSwerveCustom, drive_input
 from oi.OI import OI
+from oi.haptics import Haptics
 from robot_systems import Robot, Pneumatics, Sensors
 from sensors.color_sensors import ColorSensors
 from sensors.field_odometry import FieldOdometry
 from sensors.intake_cameras import IntakeCameras
 from sensors.limelight import Limelight
+from sensors.power_distribution import PowerSampler
+from sensors.shot_detector import ShotDetector
+from utils.feed_scheduler import FeedScheduler
+from utils.flywheel_model import ShotLog, fit_from_log
 from sensors.rev_digit import RevDigit
 
 from robotpy_toolkit_7407.utils.units import rad, deg, radians, meters_per_second, m, s
@@ -77,6 +82,7 @@ class _Robot(wpilib.TimedRobot):
         # OI
         OI.init()
         OI.map_controls()
+        Robot.haptics = Haptics()
 
         Robot.rev_digit = RevDigit()
 
@@ -84,10 +90,19 @@ class _Robot(wpilib.TimedRobot):
         Pneumatics.compressor.enableAnalog(90, 120)
 
         Sensors.color_sensors = ColorSensors()
+        Sensors.color_sensors.start()
+
+        Sensors.power = PowerSampler([
+            constants.pdh_left_intake_channel,
+            constants.pdh_right_intake_channel,
+            constants.pdh_flywheel_channel,
+        ])
+        Sensors.shots = ShotDetector()
+        Robot.feed_scheduler = FeedScheduler()
 
         commands2.CommandScheduler.getInstance().setPeriod(constants.period)
 
-        # Robot.intake_cameras = IntakeCameras(Robot.intake)  # TODO
+        Robot.intake_cameras = IntakeCameras(Robot.intake)
 
         Robot.odometry = FieldOdometry(Robot.drivetrain)
 
@@ -104,19 +119,42 @@ class _Robot(wpilib.TimedRobot):
         Robot.drivetrain.gyro._gyro.setYaw(
             self.initial_pose.rotation().degrees()
         )
-        Robot.drivetrain.odometry.resetPosition(self.initial_pose, self.initial_pose.rotation())
+        Robot.drivetrain.reset_odometry(self.initial_pose, self.initial_pose.rotation())
+        if constants.odometry_thread:
+            Robot.drivetrain.start_odometry_thread()
 
         logger.info("initialization complete")
 
     def robotPeriodic(self):
         Robot.rev_digit.update()
+        Robot.intake_cameras.read_camera_data()
+        Sensors.power.update()
+        now = wpilib.Timer.getFPGATimestamp()
+        flywheel_vel = [Robot.shooter.m_top.get_sensor_velocity(), Robot.shooter.m_bottom.get_sensor_velocity()]
+        flywheel_desired = [Robot.shooter.desired_m_top, Robot.shooter.desired_m_bottom]
+        shot = Sensors.shots.update(now, Sensors.power.get(constants.pdh_flywheel_channel),
+                                    flywheel_vel[0], flywheel_desired[0], flywheel_vel[1], flywheel_desired[1])
+        Robot.feed_scheduler.update(now, flywheel_vel, flywheel_desired, shot)
+        Robot.shooter.shot_log.update(
+            now, shot, Robot.shooter.target_distance, Robot.shooter.launch_angle, Robot.shooter.exit_velocity,
+            (flywheel_desired[0] / constants.shooter_top_gear_ratio,
+             flywheel_desired[1] / constants.shooter_bottom_gear_ratio),
+            (flywheel_vel[0] / constants.shooter_top_gear_ratio, flywheel_vel[1] / constants.shooter_bottom_gear_ratio)
+        )
+        # Flywheel calibration: set to "made", "short", "long", "left" or "right" after each shot
+        outcome = wpilib.SmartDashboard.getString("Shot Outcome", "")
+        if outcome:
+            wpilib.SmartDashboard.putString("Shot Outcome", "")
+            if outcome in ShotLog.outcomes:
+                Robot.shooter.shot_log.label_last(outcome)
         commands2.CommandScheduler.getInstance().run()
+        Robot.haptics.update()
         wpilib.SmartDashboard.putString('DB/String 0', f'Team Color: {config.TEAM}')
         wpilib.SmartDashboard.putString('DB/String 1', f'CALL 4 PRGMER HELP <3?: {self.emergency}')
         wpilib.SmartDashboard.putString('DB/String 2',
                                         f'Compressor Value: {round(Pneumatics.compressor.getPressure(), 1)}')
         wpilib.SmartDashboard.putString('DB/String 3',
-                                        f'D_Motor Temp (C): {(Robot.drivetrain.n_00.m_move._motor.getTemperature() + Robot.drivetrain.n_01.m_move._motor.getTemperature() + Robot.drivetrain.n_10.m_move._motor.getTemperature() + Robot.drivetrain.n_11.m_move._motor.getTemperature()) / 4}')
+                                        f'D_Motor Temp (C): {Robot.drivetrain.snapshot.mean_temperature}')
         # wpilib.SmartDashboard.putString('DB/String 5', f'Color Sensors: {"WORKING" if Sensors.color_sensors.working == True else "FAILED" if not Sensors.color_sensors.working else Sensors.color_sensors.working}')
         wpilib.SmartDashboard.putString('DB/String 6', f'EJECTION_ON: {config.EJECT_ENABLE}')
         wpilib.SmartDashboard.putString('DB/String 7', f'AUTO MODE: {self.auto_combo}')
@@ -150,6 +188,8 @@ class _Robot(wpilib.TimedRobot):
 
     def teleopInit(self) -> None:
         Robot.shooter.auto_finished = True
+        # The slew limited sticks start from rest, not from where they were when the robot was last driven
+        drive_input.reset()
 
         # if not self.turret_zeroed:
         #     # This will become a command soon
@@ -173,7 +213,7 @@ class _Robot(wpilib.TimedRobot):
         Robot.shooter.target_turret_angle = None
 
     def teleopPeriodic(self) -> None:
-        logger.info(Robot.drivetrain.odometry.getPose())
+        logger.info(Robot.drivetrain.get_pose())
         # print("Turret current angle: ", math.degrees(Robot.shooter.get_turret_rotation_angle()))
         wpilib.SmartDashboard.putBoolean("AIMING", Robot.shooter.aiming)
         # print(Robot.odometry.robot_pose)
@@ -191,10 +231,25 @@ class _Robot(wpilib.TimedRobot):
         pass
 
     def disabledInit(self) -> None:
-        pass
+        Robot.haptics.stop()
+        wpilib.SmartDashboard.putString("Color Calibration Label", "")
+        wpilib.SmartDashboard.putBoolean("Save Color Calibration", False)
+        wpilib.SmartDashboard.putBoolean("Save Flywheel Model", False)
 
     def disabledPeriodic(self) -> None:
-        pass
+        # Color sensor calibration: hold a ball at both sensors and set the label to "red", "blue" or "none"
+        label = wpilib.SmartDashboard.getString("Color Calibration Label", "")
+        Sensors.color_sensors.calibration_label = label if label in ("red", "blue", "none") else None
+        if wpilib.SmartDashboard.getBoolean("Save Color Calibration", False):
+            wpilib.SmartDashboard.putBoolean("Save Color Calibration", False)
+            if Sensors.color_sensors.save_calibration():
+                logger.info("saved color sensor calibration")
+        if wpilib.SmartDashboard.getBoolean("Save Flywheel Model", False):
+            # Adds this session's shots to the log and refits from every made shot in it
+            wpilib.SmartDashboard.putBoolean("Save Flywheel Model", False)
+            Robot.shooter.shot_log.save()
+            Robot.shooter.flywheel_model = fit_from_log()
+            logger.info("saved flywheel model")
 
     def _simulationInit(self) -> None:
         ...
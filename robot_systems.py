@@ -12,6 +12,10 @@ from sensors.field_odometry import FieldOdometry
 from sensors.rev_digit import RevDigit
 from sensors.intake_cameras import IntakeCameras
 from sensors.limelight import Limelight
+from sensors.power_distribution import PowerSampler
+from sensors.shot_detector import ShotDetector
+from utils.feed_scheduler import FeedScheduler
+from oi.haptics import Haptics
 
 
 class Robot:
@@ -25,6 +29,8 @@ class Robot:
     odometry: FieldOdometry
     rev_digit: RevDigit
     intake_cameras: IntakeCameras
+    haptics: Haptics
+    feed_scheduler: FeedScheduler
 
 
 class Pneumatics:
@@ -37,3 +43,5 @@ class Pneumatics:
 
 class Sensors:
     color_sensors: ColorSensors
+    power: PowerSampler
+    shots: ShotDetector
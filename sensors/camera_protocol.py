@@ -0,0 +1,28 @@
+import struct
+
+# Intake camera stream framing. Each frame is a fixed header followed by the raw JPEG bytes:
+#   magic (2s), camera id (B), sequence (I), timestamp in seconds (d), payload length (I)
+# Everything is big endian. The JPEGs are sent as-is, they're already compressed.
+MAGIC = b"CF"
+HEADER = struct.Struct(">2sBIdI")
+HEADER_SIZE = HEADER.size
+
+
+def pack_header(camera_id: int, seq: int, timestamp: float, length: int) -> bytes:
+    return HEADER.pack(MAGIC, camera_id, seq & 0xFFFFFFFF, timestamp, length)
+
+
+def unpack_header(data: bytes) -> tuple[int, int, float, int]:
+    '''
+    Parses a frame header
+
+    :Param bytes data: exactly HEADER_SIZE bytes
+
+    :Raises ValueError: if the magic doesn't match (stream is out of sync)
+
+    Returns (camera id, sequence, timestamp, payload length)
+    '''
+    magic, camera_id, seq, timestamp, length = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f"bad frame magic {magic!r}")
+    return camera_id, seq, timestamp, length
@@ -0,0 +1,95 @@
+import time
+
+# Bandwidth the intake cameras are allowed to use on the field network, bytes/s (2 Mbit/s)
+bandwidth_budget = 250000
+
+min_fps = 5
+max_fps = 30
+detection_fps = 15  # Rate needed for ball detection when nobody is watching
+
+min_quality = 20
+max_quality = 90
+default_quality = 50
+quality_step = 5
+
+deployed_weight = 4  # Share of the bandwidth a camera gets when its intake is down, others get 1
+
+
+class CameraRateController:
+    '''
+    Picks a capture rate and JPEG quality for each intake camera so the stream fits in
+    bandwidth_budget, giving most of it to the cameras whose intakes are down.
+    '''
+
+    def __init__(self, num_cameras: int):
+        '''
+        :Param int num_cameras: number of cameras to control
+        '''
+        self.num_cameras = num_cameras
+        self.fps = [float(detection_fps)] * num_cameras
+        self.quality = [default_quality] * num_cameras
+        self.deployed = [False] * num_cameras
+        self.clients = 0
+
+        self._frame_size = [0.0] * num_cameras  # moving average of JPEG size per camera
+        self._sent_bytes = 0
+        self._window_start = time.monotonic()
+        self.throughput = 0.0  # measured bytes/s sent to clients
+
+    def record_frame(self, camera: int, size: int):
+        if self._frame_size[camera] == 0:
+            self._frame_size[camera] = size
+        else:
+            self._frame_size[camera] += 0.2 * (size - self._frame_size[camera])
+
+    def record_sent(self, size: int):
+        self._sent_bytes += size
+
+    def set_clients(self, clients: int):
+        self.clients = clients
+
+    def set_deployed(self, camera: int, deployed: bool):
+        self.deployed[camera] = deployed
+
+    def period(self, camera: int) -> float:
+        return 1 / self.fps[camera]
+
+    def update(self):
+        # Called about once a second to re-plan rates
+        t = time.monotonic()
+        if t - self._window_start > 0:
+            self.throughput = self._sent_bytes / (t - self._window_start)
+        self._sent_bytes = 0
+        self._window_start = t
+
+        if self.clients == 0:
+            # Nothing to stream, only capture what ball detection needs
+            for i in range(self.num_cameras):
+                self.fps[i] = detection_fps if self.deployed[i] else min_fps
+            return
+
+        weights = [deployed_weight if d else 1 for d in self.deployed]
+        total_weight = sum(weights)
+
+        # If the link is sending more than planned (headers, retransmits), plan with less
+        budget = bandwidth_budget
+        planned = sum(self.fps[i] * self._frame_size[i] for i in range(self.num_cameras)) * self.clients
+        if planned > 0 and self.throughput > planned:
+            budget *= planned / self.throughput
+
+        for i in range(self.num_cameras):
+            share = budget * weights[i] / total_weight / self.clients
+            frame_size = self._frame_size[i]
+            if frame_size <= 0:
+                self.fps[i] = detection_fps if self.deployed[i] else min_fps
+                continue
+
+            fps = share / frame_size
+            target_fps = max_fps if self.deployed[i] else detection_fps
+            if fps < target_fps and self.quality[i] > min_quality:
+                # Trade quality for frame rate first
+                self.quality[i] = max(self.quality[i] - quality_step, min_quality)
+            elif fps > 1.5 * target_fps and self.quality[i] < max_quality:
+                self.quality[i] = min(self.quality[i] + quality_step, max_quality)
+
+            self.fps[i] = max(min(fps, target_fps), min_fps)
@@ -1,19 +1,240 @@
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from threading import Thread, Lock
+
 from rev import ColorSensorV3
-from wpilib import I2C
+from wpilib import DriverStation, I2C
+
+LEFT_CHANNEL = 0b0100
+RIGHT_CHANNEL = 0b1000
+
+CALIBRATION_FILE = os.path.join(os.path.dirname(__file__), "color_calibration.json")
+
+
+@dataclass
+class ColorReading:
+    r: float
+    g: float
+    b: float
+    prox: int
+    color: str  # "red", "blue" or "none"
+    timestamp: float
+
+
+class ColorClassifier:
+    '''
+    Nearest-centroid classifier on normalized chromaticity (share of red and green in r+g+b).
+    The centroids are baked into a lookup table so classifying is one index.
+    '''
+    table_size = 32  # cells per chromaticity axis
+    fallback_threshold = 500  # raw red/blue difference used until the side is calibrated
+    fallback_blue_green = 400  # raw green a blue ball also shows, keeps dim bluish light from counting as blue
+    labels = ("red", "blue", "none")
+
+    def __init__(self):
+        self.centroids: dict[str, tuple[float, float]] = {}
+        self.table: list[str] | None = None
+
+    @staticmethod
+    def chromaticity(vals) -> tuple[float, float] | None:
+        total = vals[0] + vals[1] + vals[2]
+        if total <= 0:
+            return None
+        return vals[0] / total, vals[1] / total
 
+    def fit(self, samples: dict[str, list[tuple]]):
+        '''
+        Builds the centroids and lookup table from labeled samples
 
-# import time
+        :Param dict samples: label ("red", "blue", "none") to raw (r, g, b, prox) readings
+        '''
+        centroids = {}
+        for label, readings in samples.items():
+            points = [c for c in map(self.chromaticity, readings) if c is not None]
+            if points:
+                centroids[label] = (
+                    sum(p[0] for p in points) / len(points),
+                    sum(p[1] for p in points) / len(points)
+                )
+        self.set_centroids(centroids)
+
+    def set_centroids(self, centroids: dict[str, tuple[float, float]]):
+        self.centroids = dict(centroids)
+        if not self.centroids:
+            self.table = None
+            return
+        n = self.table_size
+        table = []
+        for i in range(n):
+            for j in range(n):
+                cr = (i + 0.5) / n
+                cg = (j + 0.5) / n
+                table.append(min(
+                    self.centroids,
+                    key=lambda label: (self.centroids[label][0] - cr) ** 2 + (self.centroids[label][1] - cg) ** 2
+                ))
+        self.table = table
+
+    def classify(self, vals) -> str:
+        if self.table is None:
+            if vals[0] - vals[2] > self.fallback_threshold:
+                return "red"
+            elif vals[2] - vals[0] > self.fallback_threshold and vals[1] > self.fallback_blue_green:
+                return "blue"
+            return "none"
+        c = self.chromaticity(vals)
+        if c is None:
+            return "none"
+        n = self.table_size
+        i = min(int(c[0] * n), n - 1)
+        j = min(int(c[1] * n), n - 1)
+        return self.table[i * n + j]
 
 
 class ColorSensors:
+    sample_period = 0.01  # seconds between samples, sides alternate so each side updates every 2 periods
+    min_recovery_backoff = 0.1  # seconds before recreating a sensor that stopped reading
+    max_recovery_backoff = 2
+    stale_after = 0.1  # seconds, an older reading is from a sensor that stopped answering
+    max_calibration_samples = 500  # per side and label, the oldest are dropped past this (10s of sampling)
+
     def __init__(self):
         self.multiplexer = I2C(I2C.Port.kMXP, 0x71)
-        self.multiplexer.writeBulk(bytes([0b0100]))
+        self.multiplexer.writeBulk(bytes([LEFT_CHANNEL]))
         self.sensor = ColorSensorV3(I2C.Port.kMXP)
-        self.multiplexer.writeBulk(bytes([0b1000]))
+        self.multiplexer.writeBulk(bytes([RIGHT_CHANNEL]))
         self.sensor = ColorSensorV3(I2C.Port.kMXP)
         self.working = "ples_enable"
 
+        # Latest reading from each side, published by the sampler thread
+        self.left: ColorReading | None = None
+        self.right: ColorReading | None = None
+
+        self.classifiers = {"left": ColorClassifier(), "right": ColorClassifier()}
+        self.load_calibration()
+
+        # Label to record samples under, e.g. "red" while holding a red ball at both sensors
+        self.calibration_label: str | None = None
+        self.calibration_samples = {"left": {}, "right": {}}
+
+        # Per side, a dead sensor keeps backing off even while the other side reads fine
+        self._recovery_backoff = {"left": self.min_recovery_backoff, "right": self.min_recovery_backoff}
+        self._recover_at: dict[str, float | None] = {"left": None, "right": None}
+
+        self._i2c_lock = Lock()
+        self._sampler: Thread | None = None
+
+    def start(self):
+        # Starts the background sampler. After this only the sampler should touch the multiplexer
+        if self._sampler is None:
+            self._sampler = Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        channels = ((LEFT_CHANNEL, "left"), (RIGHT_CHANNEL, "right"))
+        i = 0
+        while True:
+            channel, side = channels[i]
+            try:
+                with self._i2c_lock:
+                    self._recover(side)
+                    self.multiplexer.writeBulk(bytes([channel]))
+                    reading = self._read(side)
+                setattr(self, side, reading)
+                label = self.calibration_label
+                # Only while disabled, the label is left over from the last calibration otherwise
+                if label is not None and DriverStation.isDisabled():
+                    samples = self.calibration_samples[side]
+                    if label not in samples:
+                        samples[label] = deque(maxlen=self.max_calibration_samples)
+                    samples[label].append((reading.r, reading.g, reading.b, reading.prox))
+            except Exception as e:
+                print("Color sensor read failed:", e)
+                self._schedule_recovery(side)
+            i = 1 - i
+            time.sleep(self.sample_period)
+
+    def _schedule_recovery(self, side: str):
+        if self._recover_at[side] is None:
+            self._recover_at[side] = time.monotonic() + self._recovery_backoff[side]
+            self._recovery_backoff[side] = min(self._recovery_backoff[side] * 2, self.max_recovery_backoff)
+
+    def _recover(self, side: str):
+        # Sensor dropped off the bus, recreate it once the backoff has passed
+        recover_at = self._recover_at[side]
+        if recover_at is not None and time.monotonic() >= recover_at:
+            self._recover_at[side] = None
+            self.multiplexer = I2C(I2C.Port.kMXP, 0x71)
+            self.sensor = ColorSensorV3(I2C.Port.kMXP)
+
+    def _read(self, side: str) -> ColorReading:
+        vals = self.get_val()
+        if vals[0] == 0:
+            self._schedule_recovery(side)
+        else:
+            self._recovery_backoff[side] = self.min_recovery_backoff
+        return ColorReading(*vals, self.classify(vals, side), time.monotonic())
+
+    def classify(self, vals, side: str = "left") -> str:
+        return self.classifiers[side].classify(vals)
+
+    def save_calibration(self) -> bool:
+        '''
+        Fits the classifiers to the recorded samples and writes the centroids to CALIBRATION_FILE.
+        Refuses unless both sides have samples of every label, a table missing one would
+        classify every ball as the others.
+
+        Returns True if it saved, the samples are kept otherwise so the missing labels can be added
+        '''
+        for side, samples in self.calibration_samples.items():
+            missing = [label for label in ColorClassifier.labels if not samples.get(label)]
+            if missing:
+                print(f"Color calibration not saved, {side} has no samples for {', '.join(missing)}")
+                return False
+        for side, samples in self.calibration_samples.items():
+            self.classifiers[side].fit(samples)
+        with open(CALIBRATION_FILE, "w") as f:
+            json.dump({side: c.centroids for side, c in self.classifiers.items()}, f)
+        self.calibration_samples = {"left": {}, "right": {}}
+        return True
+
+    def load_calibration(self):
+        try:
+            with open(CALIBRATION_FILE) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for side, centroids in data.items():
+            if side in self.classifiers:
+                self.classifiers[side].set_centroids({k: tuple(v) for k, v in centroids.items()})
+
+    def _fresh(self, reading: ColorReading | None) -> bool:
+        return reading is not None and time.monotonic() - reading.timestamp < self.stale_after
+
+    def left_color(self) -> str:
+        # "none" once the sampler stops updating this side, rather than its last color forever
+        reading = self.left
+        return reading.color if self._fresh(reading) else "none"
+
+    def right_color(self) -> str:
+        reading = self.right
+        return reading.color if self._fresh(reading) else "none"
+
+    def left_val(self) -> tuple:
+        reading = self.left
+        if reading is None:
+            return 0, 0, 0, 0
+        return reading.r, reading.g, reading.b, reading.prox
+
+    def right_val(self) -> tuple:
+        reading = self.right
+        if reading is None:
+            return 0, 0, 0, 0
+        return reading.r, reading.g, reading.b, reading.prox
+
     def get_val(self) -> tuple[float, float, float, int]:
         c = self.sensor.getRawColor()
         return c.red, c.green, c.blue, self.sensor.getProximity()
@@ -21,39 +242,23 @@ class ColorSensors:
     def color(self) -> str:
         vals = self.get_val()
         if vals[0] == 0:
-            self.multiplexer = I2C(I2C.Port.kMXP, 0x71)
-            self.sensor = ColorSensorV3(I2C.Port.kMXP)
-        if vals[0] - vals[2] > 500:
-            return "red"
-        elif vals[2] - vals[0] > 500 and vals[1] > 400:
-            return "blue"
-        return "none"
+            self._schedule_recovery("left")
+        return self.classify(vals)
 
     def get_color_left(self) -> str:
-        self.multiplexer.writeBulk(bytes([0b1000]))
-        # time.sleep(.02)
-        vals = self.get_val()
-        if vals[0] - vals[2] > 2000:
-            return "red"
-        elif vals[2] - vals[0] > 2000:
-            return "blue"
-        return "none"
+        self.multiplexer.writeBulk(bytes([LEFT_CHANNEL]))
+        return self.classify(self.get_val(), "left")
 
     def get_color_right(self) -> str:
-        self.multiplexer.writeBulk(bytes([0b100]))
-        vals = self.get_val()
-        if vals[0] - vals[2] > 2000:
-            return "red"
-        elif vals[2] - vals[0] > 2000:
-            return "blue"
-        return "none"
+        self.multiplexer.writeBulk(bytes([RIGHT_CHANNEL]))
+        return self.classify(self.get_val(), "right")
 
     def get_val_left(self) -> tuple:
-        self.multiplexer.writeBulk(bytes([0b1000]))
+        self.multiplexer.writeBulk(bytes([LEFT_CHANNEL]))
         return self.get_val()
 
     def get_val_right(self) -> tuple:
-        self.multiplexer.writeBulk(bytes([0b100]))
+        self.multiplexer.writeBulk(bytes([RIGHT_CHANNEL]))
         return self.get_val()
 
     def test_all(self):
@@ -16,9 +16,15 @@ redUpper2 = np.array([179,255,255])
 bumperThres = 420
 #upperThres = 100
 
-old_pts = [None,None]
 max_balls = 5
 
+# Tracker tuning. Positions are in the normalized units returned by generate_circles
+track_gate = 0.25  # max distance between a prediction and a detection to be the same ball
+track_alpha = 0.6  # position smoothing, 1 = trust detection completely
+track_beta = 0.3  # velocity smoothing
+track_min_hits = 2  # detections before a track is reported
+track_max_misses = 6  # frames a track survives without a detection
+
 
 r_threshold = [15,80,15]
 # def cvimage_to_pygame(image):
@@ -73,4 +79,104 @@ def generate_circles(frame):
     return [valid_circles,frame]
 
 
-
+class _Track:
+    def __init__(self, track_id, x, y, r):
+        self.id = track_id
+        self.x = x
+        self.y = y
+        self.r = r
+        self.vx = 0.0
+        self.vy = 0.0
+        self.hits = 1
+        self.misses = 0
+        self.since_measured = 0.0  # seconds predicted since the last detection, detection skips frames
+
+    def predict(self, dt):
+        self.x += self.vx * dt
+        self.y += self.vy * dt
+        self.since_measured += dt
+
+    def correct(self, x, y, r):
+        # alpha-beta filter on position, constant velocity model
+        ex = x - self.x
+        ey = y - self.y
+        self.x += track_alpha * ex
+        self.y += track_alpha * ey
+        if self.since_measured > 0:
+            self.vx += track_beta * ex / self.since_measured
+            self.vy += track_beta * ey / self.since_measured
+        self.since_measured = 0.0
+        self.r = r
+        self.hits += 1
+        self.misses = 0
+
+
+class BallTracker:
+    '''
+    Tracks balls across frames so detections don't jitter and detection
+    doesn't have to run on every frame.
+
+    Call update() with the circles from generate_circles on frames where detection
+    runs, and predict() on the frames in between.
+    '''
+
+    def __init__(self):
+        self.tracks = []
+        self._next_id = 0
+
+    def predict(self, dt):
+        for t in self.tracks:
+            t.predict(dt)
+        return self.balls()
+
+    def update(self, circles, dt):
+        '''
+        Associates new detections with existing tracks
+
+        :Param list circles: (x, y, r) detections from generate_circles
+
+        :Param float dt: seconds since the last predict/update
+
+        Returns the confirmed balls in the same (x, y, r) format
+        '''
+        for t in self.tracks:
+            t.predict(dt)
+
+        # Greedy nearest neighbour, closest pairs first
+        pairs = []
+        for ti, t in enumerate(self.tracks):
+            for ci, (x, y, _) in enumerate(circles):
+                d = ((t.x - x) ** 2 + (t.y - y) ** 2) ** .5
+                if d < track_gate:
+                    pairs.append((d, ti, ci))
+        pairs.sort()
+
+        used_tracks = set()
+        used_circles = set()
+        for _, ti, ci in pairs:
+            if ti in used_tracks or ci in used_circles:
+                continue
+            used_tracks.add(ti)
+            used_circles.add(ci)
+            self.tracks[ti].correct(*circles[ci])
+
+        for ti, t in enumerate(self.tracks):
+            if ti not in used_tracks:
+                t.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= track_max_misses]
+
+        for ci, (x, y, r) in enumerate(circles):
+            if ci not in used_circles and len(self.tracks) < max_balls:
+                self.tracks.append(_Track(self._next_id, x, y, r))
+                self._next_id += 1
+
+        return self.balls()
+
+    def balls(self):
+        # Closest balls (largest y) first
+        found = [(round(t.x, 3), round(t.y, 3), t.r) for t in self.tracks if t.hits >= track_min_hits]
+        found.sort(key=lambda b: -b[1])
+        return found
+
+    def reset(self):
+        self.tracks = []
@@ -6,6 +6,7 @@ from robotpy_toolkit_7407.utils.units import meters, radians
 from wpimath.geometry import Pose2d, Rotation2d, Translation2d
 
 from subsystem import Drivetrain
+from utils.turret_tracking import TurretTracker
 
 
 class FieldOdometry:
@@ -33,7 +34,7 @@ class FieldOdometry:
     def update(self):
         self._collect_limelight_data()
         self.robot_pose = Pose2d(
-            self.drivetrain.odometry.getPose().translation(),
+            self.drivetrain.get_pose().translation(),
             Rotation2d(self.drivetrain.gyro.get_robot_heading())
         )
         self._calc_values_from_pose()
@@ -42,7 +43,7 @@ class FieldOdometry:
         if self.last_update_time is None or t > self.last_update_time + self.min_update_wait_time:
             new_pose = self._calc_pose_from_limelight(self.robot_pose.rotation())
             if new_pose is not None:
-                self.drivetrain.odometry.resetPosition(new_pose, self.robot_pose.rotation())
+                self.drivetrain.reset_odometry(new_pose, self.robot_pose.rotation())
             self.last_update_time = t
             # print(f"hub_dist={self.hub_dist}, limelight_angle={self.hub_angle}")
             # print(f"new_pose={new_pose}, limelight_vals={self._l_tx, self._l_dist}")
@@ -54,6 +55,17 @@ class FieldOdometry:
             return self.hub_angle + float(math.radians(180))
         return float(self.hub_angle)
 
+    def hub_bearing_rate(self) -> float | None:
+        # How fast the hub is moving around the chassis (rad/s, ccw), None until there's a pose
+        snapshot = self.drivetrain.snapshot
+        if self.robot_pose is None:
+            return None
+        return TurretTracker.hub_bearing_rate(
+            self.robot_pose.X(), self.robot_pose.Y(), self.robot_pose.rotation().radians(),
+            self._hub_pose.X(), self._hub_pose.Y(),
+            snapshot.vx, snapshot.vy, snapshot.omega
+        )
+
     def _calc_values_from_pose(self):
         offset = self._hub_pose.relativeTo(self.robot_pose)
 
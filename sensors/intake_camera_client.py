@@ -0,0 +1,58 @@
+# Driver station viewer for the intake camera stream.
+# Run from this folder: python intake_camera_client.py [host]
+
+import socket
+import sys
+
+import cv2
+import numpy as np
+
+import camera_protocol
+
+HOST = '10.74.7.2'
+PORT = 5810
+
+
+def recv_exact(sock, n):
+    buff = bytearray(n)
+    view = memoryview(buff)
+    got = 0
+    while got < n:
+        r = sock.recv_into(view[got:], n - got)
+        if r == 0:
+            raise ConnectionError("server closed the stream")
+        got += r
+    return buff
+
+
+def read_frame(sock):
+    '''
+    Reads one frame from the stream
+
+    Returns (camera id, sequence, timestamp, jpeg bytes)
+    '''
+    camera_id, seq, timestamp, length = camera_protocol.unpack_header(
+        bytes(recv_exact(sock, camera_protocol.HEADER_SIZE)))
+    return camera_id, seq, timestamp, recv_exact(sock, length)
+
+
+def main(host):
+    sock = socket.create_connection((host, PORT))
+    print(f"connected to {host}:{PORT}")
+    last_seq = {}
+    while True:
+        camera_id, seq, timestamp, jpeg = read_frame(sock)
+        if camera_id in last_seq and seq != last_seq[camera_id] + 1:
+            print(f"camera {camera_id}: skipped {seq - last_seq[camera_id] - 1} frames")
+        last_seq[camera_id] = seq
+
+        image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        if image is not None:
+            cv2.imshow(f"intake camera {camera_id}", image)
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+    sock.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else HOST)
@@ -1,11 +1,13 @@
+import asyncio
 import socket
 import struct
+import sys
 import time
-import pickle
 import serial
-import zlib
-from threading import Thread
+from threading import Thread, Lock
 import detect_balls
+import camera_protocol
+import camera_rate
 import numpy as np
 import cv2
 from multiprocessing.connection import Client
@@ -18,25 +20,16 @@ ports = ['/dev/ttyACM0','/dev/ttyACM1','/dev/ttyACM2']
 #/dev/tty.usbmodem3051395331301
 HOST = ''
 PORT = 5810
-max_fps = 20
 img_size = (320, 240)
+request_quality = False  # Only enable with camera firmware that understands the "qual" command
+client_queue_size = 2  # Frames buffered per viewer in asyncio mode before old ones are dropped
 
-
-
-# max_fps = 40
-
-s = socket.socket(socket.AF_INET, socket.SOCK_STREAM,)
-print('Socket created')
-
-s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-s.bind((HOST, PORT))
-print('Socket bind complete')
-s.listen(10)
-print('Socket now listening')
 connections = []
 active_ports = []
 
+rate_controller = camera_rate.CameraRateController(2)
+camera_intake_side = [1, 0]  # Camera 0 looks out the right intake, camera 1 the left (index into (left, right))
+
 
 
 
@@ -58,7 +51,9 @@ def convert_buff(buffer):
 
 
 
-def dump(s_port):
+def dump(s_port, quality=None):
+    if quality is not None:
+        s_port.write("qual".encode() + bytes([quality]))
     s_port.write("snap".encode())
     s_port.flush()
     # num_bytes = struct.unpack('<L', buffer)[0]
@@ -68,125 +63,443 @@ def dump(s_port):
     return buff
 
 
+def open_port(camera_port):
+    try:
+        new_port = serial.Serial(camera_port, baudrate=115200, bytesize=serial.EIGHTBITS,
+                                 parity=serial.PARITY_NONE,
+                                 xonxoff=False, rtscts=False, stopbits=serial.STOPBITS_ONE, timeout=None,
+                                 dsrdtr=True)
+        print("connected to: " + camera_port)
+        return new_port
+    except Exception as e:
+        print("Failed to init: " + camera_port)
+        return None
+
+
 def attemptConnections(ports):
     while True:
         for camera_port in ports:
             if camera_port not in map(lambda a: a.port, active_ports):
-                try:
-                    new_port = serial.Serial(camera_port, baudrate=115200, bytesize=serial.EIGHTBITS,
-                                             parity=serial.PARITY_NONE,
-                                             xonxoff=False, rtscts=False, stopbits=serial.STOPBITS_ONE, timeout=None,
-                                             dsrdtr=True)
-                    print("connected to: " + camera_port)
+                new_port = open_port(camera_port)
+                if new_port is not None:
                     active_ports.append(new_port)
-                except Exception as e:
-                    print("Failed to init: " + camera_port)
             else:
                 print("Camera already initiated")
         time.sleep(5)
 
 
-frames_buff = [b''] * len(ports)
+frames_buff = [b''] * 2
+frames_seq = [0] * len(ports)  # Goes up every time a camera gives a new frame
+frames_time = [0.0] * len(ports)
+frames_lock = Lock()  # a frame and its seq always change together, so a sender never pairs one with the other's
+def record_frame(camera_id, frame):
+    with frames_lock:
+        frames_buff[camera_id] = frame
+        frames_seq[camera_id] += 1
+        frames_time[camera_id] = time.time()
+    rate_controller.record_frame(camera_id, len(frame))
+
+
+def clear_frame(camera_id):
+    with frames_lock:
+        frames_buff[camera_id] = b''
+
+
+def latest_frames():
+    # Consistent copy of (frames, seqs, times)
+    with frames_lock:
+        return list(frames_buff), list(frames_seq), list(frames_time)
+
+
 def dumpBuffers():
-    global frames_buff
+    next_capture = [0.0] * 2
+    sent_quality = [None] * 2
     while True:
-        temp_buff = [b''] * len(ports)
         for i in range(len(active_ports)):
+            if i >= 2:
+                break
+            t = time.time()
+            if t < next_capture[i]:
+                continue
+            next_capture[i] = t + rate_controller.period(i)
+
+            quality = None
+            if request_quality and rate_controller.quality[i] != sent_quality[i]:
+                quality = rate_controller.quality[i]
             try:
-                temp_buff[i] = dump(active_ports[i])
+                frame = dump(active_ports[i], quality)
+                if quality is not None:
+                    sent_quality[i] = quality
+                record_frame(i, frame)
             except:
+                clear_frame(i)
+                sent_quality[i] = None
                 try:
                     del active_ports[i]
                 except:
                     pass
-        frames_buff = temp_buff[:2]
         #print(len(frames_buff[0]), len(frames_buff[1]))
-        time.sleep(1/30)
+        # Only cameras that are connected, an unused slot's next_capture never moves
+        active = next_capture[:min(len(active_ports), 2)]
+        if active:
+            time.sleep(max(min(active) - time.time(), 0.005))
+        else:
+            time.sleep(0.1)
+
+
+def adjust_rates():
+    while True:
+        rate_controller.set_clients(len(connections))
+        rate_controller.update()
+        # print(rate_controller.fps, rate_controller.quality, rate_controller.throughput)
+        time.sleep(1)
+
+
+class ClientStream:
+    '''
+    Sends framed JPEGs to one viewer over a non-blocking socket.
+    A slow client has its frames dropped instead of holding up everyone else.
+    '''
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.conn.setblocking(False)
+        self.pending = []  # unsent remainder of the last frame
+        self.last_seq = [0] * len(ports)
+        self.dropped = 0
+        self.bytes_sent = 0
+
+    def _send(self, buffers):
+        # Scatter-gather send, returns whatever didn't make it into the socket buffer
+        try:
+            sent = self.conn.sendmsg(buffers)
+        except BlockingIOError:
+            sent = 0
+        self.bytes_sent += sent
+        rest = []
+        for b in buffers:
+            if sent >= len(b):
+                sent -= len(b)
+            else:
+                rest.append(memoryview(b)[sent:])
+                sent = 0
+        return rest
+
+    def send_frames(self, frames, seqs, times):
+        '''
+        :Raises OSError: if the client disconnected
+        '''
+        # Finish the frame that's partially sent before starting another, otherwise drop this one
+        if self.pending:
+            self.pending = self._send(self.pending)
+            if self.pending:
+                self.dropped += 1
+                return
+
+        buffers = []
+        for camera_id, frame in enumerate(frames):
+            if frame and seqs[camera_id] != self.last_seq[camera_id]:
+                self.last_seq[camera_id] = seqs[camera_id]
+                buffers.append(camera_protocol.pack_header(camera_id, seqs[camera_id], times[camera_id], len(frame)))
+                buffers.append(frame)
+        if buffers:
+            self.pending = self._send(buffers)
 
 
 def send_to_clients():
-    global frames_buff
     while True:
-        # print(len(frames_buff[0]),len(frames_buff[1]))
-        #data = pickle.dumps(frames_buff, 0)
-        data = zlib.compress(pickle.dumps(frames_buff, 0))
-        size = len(data)
-        #print(len(struct.pack(">L", size) + data), len(frames_buff[1]))
-        # print(size)
-        for connection in connections:
+        frames, seqs, times = latest_frames()
+        for client in connections[:]:
             try:
-                connection.sendall(struct.pack(">L", size) + data)
-            except IOError:
-                connections.remove(connection)
+                client.send_frames(frames, seqs, times)
+                rate_controller.record_sent(client.bytes_sent)
+                client.bytes_sent = 0
+            except OSError:
+                connections.remove(client)
+                client.conn.close()
                 print("client disconnect")
-        time.sleep(1/max_fps)
+        time.sleep(min(rate_controller.period(0), rate_controller.period(1)))
 
 
 rio_data = [[], []]
 new_rio_data = True
 
 image_scale = 2
-def detect_ball_loop():
-    global frames_buff, rio_data, new_rio_data
-    while True:
-        lr_balls = [[],[]]
-        (raw,raw2) = frames_buff
+detect_every_n_frames = 3  # Run full detection every N frames, tracker predicts in between
+def detect_step(trackers, frames, frame_num, dt):
+    '''
+    Finds the balls for both intakes
+
+    :Param list trackers: BallTracker for each side (left, right)
+
+    :Param list frames: latest JPEG from each camera
+
+    :Param int frame_num: detection only runs every detect_every_n_frames frames
+
+    :Param float dt: seconds since the last step
+
+    Returns [left balls, right balls]
+    '''
+    lr_balls = [[],[]]
+    if frame_num % detect_every_n_frames == 0:
+        (raw,raw2) = frames
         fb1 = convert_buff(raw2)
         fb2 = convert_buff(raw)
-        if fb1 != None:
-            [balls,_] = detect_balls.generate_circles(fb1[2])
-            #image = cv2.cvtColor(image,cv2.COLOR_BGR2RGB)
-            lr_balls[0] = balls
-        if fb2 != None:
-            [balls,_] = detect_balls.generate_circles(fb2[2])
-            #image = cv2.cvtColor(image,cv2.COLOR_BGR2RGB)
-            lr_balls[1] = balls
+        for i, fb in enumerate((fb1, fb2)):
+            if fb is not None:
+                [balls,_] = detect_balls.generate_circles(fb[2])
+                #image = cv2.cvtColor(image,cv2.COLOR_BGR2RGB)
+                lr_balls[i] = trackers[i].update(balls, dt)
+            else:
+                lr_balls[i] = trackers[i].predict(dt)
+    else:
+        lr_balls = [trackers[0].predict(dt), trackers[1].predict(dt)]
+    return lr_balls
+
+
+def detect_ball_loop():
+    global rio_data, new_rio_data
+    trackers = [detect_balls.BallTracker(), detect_balls.BallTracker()]
+    frame_num = 0
+    last_time = time.time()
+    while True:
+        t = time.time()
+        dt = t - last_time
+        last_time = t
+
+        lr_balls = detect_step(trackers, frames_buff, frame_num, dt)
+        frame_num += 1
         #print(lr_balls)
 
         rio_data = lr_balls
         new_rio_data = True
 
-        time.sleep(1/30)
+        # No point running faster than the cameras are capturing
+        time.sleep(min(rate_controller.period(0), rate_controller.period(1)))
 
 
-def send_rio_data():
+def connect_rio():
+    # The RIO binds before starting this process, retry in case it isn't listening yet
+    while True:
+        try:
+            return Client(('localhost', 6000))
+        except ConnectionRefusedError:
+            time.sleep(0.5)
+
+
+def set_intakes_down(intakes_down):
+    # Intake state from the RIO, (left down, right down)
+    for camera, side in enumerate(camera_intake_side):
+        rate_controller.set_deployed(camera, intakes_down[side])
+
+
+def exchange_rio_data(client):
     global new_rio_data
+    # Push new data as soon as it's ready, the RIO keeps only the latest value
+    if new_rio_data:
+        new_rio_data = False
+        client.send(rio_data)
+    while client.poll(0):
+        set_intakes_down(client.recv())
 
-    client = Client(('localhost', 6000))
 
-    while client.recv():
-        if new_rio_data:
-            client.send(rio_data)
-            new_rio_data = False
-        else:
-            client.send(None)
+def send_rio_data():
+    # Reconnects if the RIO goes away, it accepts again after a disconnect
+    while True:
+        client = connect_rio()
+        try:
+            while True:
+                exchange_rio_data(client)
+                time.sleep(1/60)
+        except (EOFError, OSError) as e:
+            print(f"RIO disconnected: {e}")
+            client.close()
+
+
+def run_threaded():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM,)
+    print('Socket created')
+
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    s.bind((HOST, PORT))
+    print('Socket bind complete')
+    s.listen(10)
+    print('Socket now listening')
+
+    threads = []
 
-threads = []
+    cam_conn = Thread(target=attemptConnections, args=[ports])
+    threads.append(cam_conn)
+    cam_conn.start()
 
-cam_conn = Thread(target=attemptConnections, args=[ports])
-threads.append(cam_conn)
-cam_conn.start()
+    buff_dumper = Thread(target=dumpBuffers, args=[ ])
+    threads.append(buff_dumper)
+    buff_dumper.start()
 
-buff_dumper = Thread(target=dumpBuffers, args=[ ])
-threads.append(buff_dumper)
-buff_dumper.start()
+    client_thread = Thread(target=send_to_clients, args=[ ])
+    threads.append(client_thread)
+    client_thread.start()
 
-client_thread = Thread(target=send_to_clients, args=[ ])
-threads.append(client_thread)
-client_thread.start()
+    ball_detector = Thread(target=detect_ball_loop, args=[])
+    threads.append(ball_detector)
+    ball_detector.start()
 
-# ball_detector = Thread(target=detect_ball_loop, args=[])
-# threads.append(ball_detector)
-# ball_detector.start()
+    rate_adjuster = Thread(target=adjust_rates, args=[])
+    threads.append(rate_adjuster)
+    rate_adjuster.start()
 
-rio_data_sender = Thread(target=send_rio_data, args=[])
-threads.append(rio_data_sender)
-rio_data_sender.start()
+    rio_data_sender = Thread(target=send_rio_data, args=[])
+    threads.append(rio_data_sender)
+    rio_data_sender.start()
 
+    while True:
+        conn, addr = s.accept()
+        connections.append(ClientStream(conn))
+        #print(threads)
+
+    s.close()
+
+
+# --- asyncio mode ---
+# Everything below runs on one event loop thread, so the shared lists above are only
+# touched from that thread. Blocking serial reads, detection and the RIO connect run in executors.
+
+
+class AsyncClient:
+    def __init__(self, writer):
+        self.writer = writer
+        self.queue = asyncio.Queue(maxsize=client_queue_size)
+        self.dropped = 0
+
+    def offer(self, header, frame):
+        # Never waits, a slow viewer loses its oldest frame
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((header, frame))
+
+
+async def handle_client(reader, writer):
+    client = AsyncClient(writer)
+    connections.append(client)
+    try:
+        while True:
+            header, frame = await client.queue.get()
+            writer.writelines((header, frame))
+            await writer.drain()
+            rate_controller.record_sent(len(header) + len(frame))
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        connections.remove(client)
+        writer.close()
+        print("client disconnect")
 
-while True:
-    conn, addr = s.accept()
-    connections.append(conn)
-    #print(threads)
 
-s.close()
\ No newline at end of file
+camera_ports = [None, None]  # serial port each camera reader owns, so two readers never share one
+
+
+async def async_attempt_connections(loop):
+    while True:
+        for camera_port in ports:
+            if None not in camera_ports:
+                break
+            if camera_port not in map(lambda a: a.port, active_ports):
+                new_port = await loop.run_in_executor(None, open_port, camera_port)
+                if new_port is not None:
+                    active_ports.append(new_port)
+                    camera_ports[camera_ports.index(None)] = new_port
+        await asyncio.sleep(5)
+
+
+async def async_camera_reader(loop, camera_id):
+    sent_quality = None
+    while True:
+        next_capture = time.time() + rate_controller.period(camera_id)
+        port = camera_ports[camera_id]
+        if port is not None:
+            quality = None
+            if request_quality and rate_controller.quality[camera_id] != sent_quality:
+                quality = rate_controller.quality[camera_id]
+            try:
+                frame = await loop.run_in_executor(None, dump, port, quality)
+                if quality is not None:
+                    sent_quality = quality
+                record_frame(camera_id, frame)
+                header = camera_protocol.pack_header(camera_id, frames_seq[camera_id], frames_time[camera_id], len(frame))
+                for client in connections:
+                    client.offer(header, frame)
+            except Exception:
+                clear_frame(camera_id)
+                sent_quality = None
+                camera_ports[camera_id] = None
+                if port in active_ports:
+                    active_ports.remove(port)
+        await asyncio.sleep(max(next_capture - time.time(), 0))
+
+
+async def async_detect_balls(loop):
+    global rio_data, new_rio_data
+    trackers = [detect_balls.BallTracker(), detect_balls.BallTracker()]
+    frame_num = 0
+    last_time = time.time()
+    while True:
+        t = time.time()
+        dt = t - last_time
+        last_time = t
+
+        rio_data = await loop.run_in_executor(None, detect_step, trackers, list(frames_buff), frame_num, dt)
+        new_rio_data = True
+        frame_num += 1
+
+        await asyncio.sleep(min(rate_controller.period(0), rate_controller.period(1)))
+
+
+async def async_rio_data(loop):
+    global new_rio_data
+    # Reconnects if the RIO goes away instead of taking the whole server down through gather
+    while True:
+        client = await loop.run_in_executor(None, connect_rio)
+        try:
+            while True:
+                if new_rio_data:
+                    new_rio_data = False
+                    # send can block on a full pipe, keep it off the event loop
+                    await loop.run_in_executor(None, client.send, rio_data)
+                while client.poll(0):
+                    set_intakes_down(client.recv())
+                await asyncio.sleep(1/60)
+        except (EOFError, OSError) as e:
+            print(f"RIO disconnected: {e}")
+            client.close()
+
+
+async def async_adjust_rates():
+    while True:
+        rate_controller.set_clients(len(connections))
+        rate_controller.update()
+        await asyncio.sleep(1)
+
+
+async def run_async():
+    loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(handle_client, HOST or None, PORT, reuse_address=True)
+    print('Socket now listening')
+    async with server:
+        await asyncio.gather(
+            server.serve_forever(),
+            async_attempt_connections(loop),
+            async_camera_reader(loop, 0),
+            async_camera_reader(loop, 1),
+            async_detect_balls(loop),
+            async_rio_data(loop),
+            async_adjust_rates(),
+        )
+
+
+if __name__ == '__main__':
+    if '--async' in sys.argv:
+        asyncio.run(run_async())
+    else:
+        run_threaded()
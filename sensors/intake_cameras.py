@@ -1,7 +1,10 @@
+import atexit
 import os
 import subprocess
 import sys
+import time
 from multiprocessing.connection import Listener
+from threading import Thread, Lock
 
 from robotpy_toolkit_7407.utils import logger
 
@@ -9,25 +12,108 @@ from subsystem import Intake
 
 
 class IntakeCameras:
+    stale_timeout = 0.25  # seconds before camera data is considered too old to use
+    use_async_server = False  # Run the camera server's asyncio event loop instead of its threads
+
     def __init__(self, intake: Intake):
+        '''
+        Starts the intake camera server and a background thread that receives its ball data.
+        Never blocks waiting on the coprocessor.
+
+        :Param Intake intake: intake subsystem that gets the found balls
+        '''
+        self.intake = intake
+
+        self._lock = Lock()
+        self._latest = None  # latest-value mailbox, (receive time, data)
+        self.connected = False
+        self._conn = None
+        self._sent_intakes_down = None
+
+        self.server_process = None
+
+        # Bind before starting the server so it always has something to connect to
+        try:
+            self.listener = Listener(('localhost', 6000))
+        except OSError as e:
+            # Port still held, e.g. by an earlier robot process. Run without camera data
+            self.listener = None
+            logger.error(f"intake cameras disabled, couldn't listen for the camera server: {e}")
+            return
+
         # Start server
         args = [sys.executable, os.path.dirname(__file__) + "/intake_camera_server.py"]
+        if self.use_async_server:
+            args.append("--async")
         logger.info(f"starting {args}...")
-        subprocess.Popen(args)
+        self.server_process = subprocess.Popen(args)
+        atexit.register(self.stop)
         logger.info("started!")
 
-        # Bind to it
-        self.listener = Listener(('localhost', 6000))
-        self.conn = self.listener.accept()
+        self._receiver = Thread(target=self._receive_loop, daemon=True)
+        self._receiver.start()
 
-        self.intake = intake
+    def stop(self):
+        # Stops the camera server and frees the port
+        if self.server_process is not None and self.server_process.poll() is None:
+            self.server_process.terminate()
+            try:
+                self.server_process.wait(1)
+            except subprocess.TimeoutExpired:
+                self.server_process.kill()
+        self.server_process = None
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+
+    def _receive_loop(self):
+        # Accept and recv block, so they only ever happen on this thread
+        while self.listener is not None:
+            try:
+                conn = self.listener.accept()
+                self._conn = conn
+                self._sent_intakes_down = None
+                self.connected = True
+                logger.info("intake camera server connected")
+                while True:
+                    data = conn.recv()
+                    with self._lock:
+                        self._latest = (time.monotonic(), data)
+            except (EOFError, OSError) as e:
+                self.connected = False
+                self._conn = None
+                logger.info(f"intake camera server disconnected: {e}")
+                time.sleep(1)
+
+    def poll(self):
+        '''
+        Returns the latest camera data without waiting, or None if there is none fresh enough
+        '''
+        with self._lock:
+            latest = self._latest
+        if latest is None or time.monotonic() - latest[0] > self.stale_timeout:
+            return None
+        return latest[1]
+
+    def send_intake_state(self):
+        # Tells the server which intakes are down so it can give those cameras more bandwidth
+        intakes_down = (self.intake.left_intake_down, self.intake.right_intake_down)
+        conn = self._conn
+        if conn is None or intakes_down == self._sent_intakes_down:
+            return
+        try:
+            conn.send(intakes_down)
+            self._sent_intakes_down = intakes_down
+        except OSError:
+            pass
 
     def read_camera_data(self):
-        # self.conn.send("c")
-        # if self.conn.poll(0.005):
-        #     data = self.conn.recv()
-        #     print(data)
-        #     if data is not None:
-        #         self.intake.intake_camera_left_found = data[0]
-        #         self.intake.intake_camera_right_found = data[1]
-        pass
\ No newline at end of file
+        # Called every tick, never waits on the coprocessor
+        self.send_intake_state()
+        data = self.poll()
+        if data is not None:
+            self.intake.intake_camera_left_found = data[0]
+            self.intake.intake_camera_right_found = data[1]
+        else:
+            self.intake.intake_camera_left_found = []
+            self.intake.intake_camera_right_found = []
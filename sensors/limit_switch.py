@@ -1,12 +1,105 @@
+from collections import deque
+from threading import Thread
+
 import wpilib
 
 
 class LimitSwitch:
-    def __init__(self, port: int, reverse: bool = True):
+    def __init__(self, port: int, reverse: bool = True, debounce: float = 0, release_debounce: float = None):
+        '''
+        :Param int port: DIO port
+
+        :Param bool reverse: True if the switch reads low when pressed
+
+        :Param float debounce: seconds the switch has to stay pressed before value turns True
+
+        :Param float release_debounce: seconds it has to stay released before value turns False (default debounce)
+        '''
         self.limit_switch = wpilib.DigitalInput(port)
         self.reverse = reverse
-    
+        self.debounce = debounce
+        self.release_debounce = debounce if release_debounce is None else release_debounce
+
+        # Debounced state, updated once per tick by update()
+        self.value = False
+        self.rising = False  # value turned True this tick
+        self.falling = False  # value turned False this tick
+        self.edge_time = 0.0  # when the raw reading that caused the last edge started
+        # Interrupt mode only, a press at least debounce long that let go between updates, so value never saw it
+        self.pressed_edge = False
+
+        self._raw = False
+        self._raw_time = 0.0
+
+        # Interrupt mode, see enable_interrupts()
+        self.interrupts = False
+        self.on_press = None  # called from the interrupt thread with the press timestamp
+        self._edges = deque()
+        self._interrupt = None
+
     def get_value(self):
+        # Raw read, not debounced
         if self.reverse:
             return not self.limit_switch.get()
         return self.limit_switch.get()
+
+    def enable_interrupts(self):
+        '''
+        Watches the DIO for edges on a background thread. Edges are queued with their FPGA timestamps
+        and used by update(), so presses between ticks aren't missed and debounce starts from the real edge.
+        '''
+        if self.interrupts:
+            return
+        self._interrupt = wpilib.SynchronousInterrupt(self.limit_switch)
+        self._interrupt.setInterruptEdges(True, True)
+        self.interrupts = True
+        Thread(target=self._interrupt_loop, daemon=True).start()
+
+    def _interrupt_loop(self):
+        WaitResult = wpilib.SynchronousInterrupt.WaitResult
+        while True:
+            result = self._interrupt.waitForInterrupt(.5, False)
+            if result == WaitResult.kTimeout:
+                continue
+            edges = []
+            if result in (WaitResult.kRisingEdge, WaitResult.kBoth):
+                edges.append((self._interrupt.getRisingTimestamp(), not self.reverse))
+            if result in (WaitResult.kFallingEdge, WaitResult.kBoth):
+                edges.append((self._interrupt.getFallingTimestamp(), self.reverse))
+            for t, pressed in sorted(edges):
+                self._edges.append((t, pressed))
+                on_press = self.on_press
+                if pressed and on_press is not None:
+                    on_press(t)
+
+    def _raw_edge(self, t, raw):
+        if raw != self._raw:
+            # Polled samples can't time a press, one noisy sample would count, so only real edge timestamps do
+            if not raw and self.interrupts and not self.value and t - self._raw_time >= self.debounce:
+                self.pressed_edge = True
+            self._raw = raw
+            self._raw_time = t
+
+    def update(self, now: float = None):
+        '''
+        Samples the switch and updates value, rising and falling. Call once per tick.
+
+        :Param float now: timestamp in seconds (default FPGA time)
+        '''
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+        self.pressed_edge = False
+        while self._edges:
+            self._raw_edge(*self._edges.popleft())
+        # Still sampled with interrupts on, an edge that is still on its way gets ignored when it shows up
+        self._raw_edge(now, self.get_value())
+
+        self.rising = False
+        self.falling = False
+        if self._raw != self.value:
+            window = self.debounce if self._raw else self.release_debounce
+            if now - self._raw_time >= window:
+                self.value = self._raw
+                self.rising = self._raw
+                self.falling = not self._raw
+                self.edge_time = self._raw_time
@@ -0,0 +1,69 @@
+from collections import deque
+
+import wpilib
+
+
+class PowerSampler:
+    '''
+    Reads the watched PDH channels once per tick and keeps a short history of each,
+    so nothing else has to query the PDH over CAN.
+    '''
+
+    window = 10  # samples kept per channel, 0.3 s at the 30 ms period
+
+    def __init__(self, channels: list[int], pdh: wpilib.PowerDistribution = None):
+        '''
+        :Param list[int] channels: PDH channels to sample
+
+        :Param PowerDistribution pdh: defaults to a new PowerDistribution
+        '''
+        self.pdh = wpilib.PowerDistribution() if pdh is None else pdh
+        self.channels = list(channels)
+        self.times = deque(maxlen=self.window)
+        self.samples = {channel: deque(maxlen=self.window) for channel in self.channels}
+        self.current = {channel: 0.0 for channel in self.channels}
+
+    def update(self, now: float = None):
+        # Called once per tick before the commands run
+        if now is None:
+            now = wpilib.Timer.getFPGATimestamp()
+        self.times.append(now)
+        for channel in self.channels:
+            amps = self.pdh.getCurrent(channel)
+            self.current[channel] = amps
+            self.samples[channel].append(amps)
+
+    def get(self, channel: int) -> float:
+        # Latest sample
+        return self.current[channel]
+
+    def _recent(self, channel, n):
+        samples = self.samples[channel]
+        if n is None or n >= len(samples):
+            return list(samples)
+        return list(samples)[-n:]
+
+    def mean(self, channel: int, n: int = None) -> float:
+        # Mean of the last n samples (default the whole window)
+        samples = self._recent(channel, n)
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def peak(self, channel: int, n: int = None) -> float:
+        samples = self._recent(channel, n)
+        return max(samples) if samples else 0.0
+
+    def slope(self, channel: int, n: int = None) -> float:
+        '''
+        Least squares slope of the last n samples
+
+        Returns amps per second, 0 with fewer than 2 samples
+        '''
+        samples = self._recent(channel, n)
+        times = list(self.times)[-len(samples):]
+        if len(samples) < 2:
+            return 0.0
+        t_mean = sum(times) / len(times)
+        a_mean = sum(samples) / len(samples)
+        num = sum((t - t_mean) * (a - a_mean) for t, a in zip(times, samples))
+        den = sum((t - t_mean) ** 2 for t in times)
+        return num / den if den > 0 else 0.0
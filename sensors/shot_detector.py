@@ -0,0 +1,111 @@
+from collections import deque
+
+
+class ShotDetector:
+    '''
+    Finds balls going through the shooter from the flywheel current and the flywheel speed.
+    A shot pulls the wheels below their setpoint and the motors draw a burst of current to recover.
+    Only counted when the wheels were at speed just before, so spinning up or changing the setpoint isn't a shot.
+    The dip and the current spike don't always land on the same tick, each is latched for a short window.
+    '''
+
+    current_rise = 4  # A above the baseline current
+    min_current = 8  # A, never a shot below this (the old single sample threshold)
+    velocity_dip = .03  # fraction below setpoint either wheel has to drop
+    refractory = .12  # s after a shot before another one can be counted
+    baseline_alpha = .3  # how fast the baseline follows the current while the wheels are at speed
+    window = .1  # s a dip and a spike can be apart and still be one shot, about 3 ticks
+
+    def __init__(self):
+        self.shots = 0  # rounds fired
+        self.events = deque(maxlen=10)  # (timestamp, round number)
+        self.baseline = None
+        self.last_shot_time = None
+        self.in_shot = False
+        self.at_speed = False
+        self.last_desired = 0.0
+        self.last_dip = None  # last tick a wheel was dipped
+        self.last_spike = None  # last tick the current spiked
+        self.dip_start = None  # when the current dip started
+
+    @staticmethod
+    def dip(velocity: float, desired: float) -> float:
+        # Fraction below the setpoint, 0 when the wheel isn't being driven
+        if desired <= 0:
+            return 0.0
+        return max(0.0, (desired - velocity) / desired)
+
+    def update(self, now: float, current: float, top_velocity: float, top_desired: float,
+               bottom_velocity: float, bottom_desired: float) -> bool:
+        '''
+        Called once per tick
+
+        :Param float now: timestamp (s)
+
+        :Param float current: flywheel channel current (A)
+
+        :Param float top_velocity: m_top sensor velocity, same units as top_desired
+
+        :Param float bottom_velocity: m_bottom sensor velocity, same units as bottom_desired
+
+        Returns True if a new shot was found this tick
+        '''
+        if abs(top_desired - self.last_desired) > self.velocity_dip * max(abs(self.last_desired), 1e-6):
+            # New setpoint, the wheels are chasing it rather than recovering from a ball
+            self.at_speed = False
+        self.last_desired = top_desired
+
+        dipped = max(self.dip(top_velocity, top_desired), self.dip(bottom_velocity, bottom_desired)) > self.velocity_dip
+        baseline = current if self.baseline is None else self.baseline
+        spike = current > self.min_current and current - baseline > self.current_rise
+        if dipped:
+            self.last_dip = now
+            if self.dip_start is None:
+                self.dip_start = now
+        else:
+            self.dip_start = None
+        if spike:
+            self.last_spike = now
+        signature = self.latched(self.last_dip, now) and self.latched(self.last_spike, now)
+
+        shot = False
+        if signature and not self.in_shot and self.at_speed:
+            if self.last_shot_time is None or now - self.last_shot_time > self.refractory:
+                self.shots += 1
+                self.events.append((now, self.shots))
+                self.last_shot_time = now
+                shot = True
+        self.in_shot = signature
+
+        if not dipped and top_desired > 0:
+            # Steady state, learn what holding speed costs
+            self.at_speed = True
+            self.baseline = baseline + self.baseline_alpha * (current - baseline)
+        elif top_desired <= 0:
+            self.at_speed = False
+        elif not signature and now - self.dip_start > self.window:
+            # Sagging with no spike to go with it, the wheels aren't holding speed
+            self.at_speed = False
+        return shot
+
+    def latched(self, t: float | None, now: float) -> bool:
+        return t is not None and now - t <= self.window
+
+    def pop_shot(self, since: float) -> tuple[float, int] | None:
+        '''
+        Takes the oldest shot that happened at or after since, older ones are thrown away
+
+        :Param float since: when the ball started moving toward the shooter
+        '''
+        while self.events:
+            event = self.events.popleft()
+            if event[0] >= since:
+                return event
+        return None
+
+    def reset(self):
+        self.shots = 0
+        self.events.clear()
+        self.in_shot = False
+        self.at_speed = False
+        self.last_dip = self.last_spike = self.dip_start = None
@@ -1,16 +1,21 @@
 import math
+import threading
 from dataclasses import dataclass
 
-from ctre import CANCoder, Pigeon2
+import wpilib
+from ctre import CANCoder, Pigeon2, PigeonIMU_StatusFrame, StatusFrameEnhanced
 from robotpy_toolkit_7407.motors import TalonFX, TalonConfig, ctre_motors
 from robotpy_toolkit_7407.subsystem_templates.drivetrain import SwerveNode, SwerveDrivetrain, SwerveGyro
+from robotpy_toolkit_7407.utils.math import bounded_angle_diff
 from robotpy_toolkit_7407.utils.units import rad, deg, s, radians, \
     meters_per_second, radians_per_second, meters
-from wpimath.geometry import Pose2d
+from wpimath.geometry import Pose2d, Rotation2d
+from wpimath.kinematics import ChassisSpeeds, SwerveModuleState
 
 import constants
 from oi.keymap import Keymap
 from utils.can_optimizations import optimize_normal_talon
+from utils.swerve_kinematics import SwerveKinematics, SwerveSnapshot
 
 TURN_IZone = 1000
 TURN_kI = 0.01
@@ -41,8 +46,51 @@ MOVE_CONFIG = TalonConfig(
 )
 
 
+class OptimizedSwerveNode(SwerveNode):
+    '''
+    Output stage shared by the swerve nodes. Turns each module at most 90 degrees plus a hysteresis band
+    (reversing the drive instead, and staying reversed until the other way is clearly shorter), scales the drive speed by the cosine of the angle still to turn, and only sends setpoints
+    that changed by more than a tolerance.
+    '''
+
+    def init(self):
+        super().init()
+        self._last_angle = None
+        self._last_velocity = None
+        self._reversed = False
+
+    def set(self, vel: meters_per_second, angle_radians: radians):
+        current = self.get_current_motor_angle()
+        diff = bounded_angle_diff(current, angle_radians)
+        if self._reversed:
+            diff -= math.copysign(math.pi, diff)
+        # A target near 90 degrees away would flip the module back and forth every tick without the band
+        if abs(diff) > math.pi / 2 + constants.swerve_flip_hysteresis:
+            diff -= math.copysign(math.pi, diff)
+            self._reversed = not self._reversed
+        if self._reversed:
+            vel = -vel
+        if constants.swerve_cosine_scaling:
+            vel *= math.cos(diff)
+        self.set_motor_angle(current + diff)
+        self.set_motor_velocity(vel)
+
+    def _angle_changed(self, pos: radians) -> bool:
+        if self._last_angle is not None and abs(pos - self._last_angle) < constants.swerve_angle_tolerance:
+            return False
+        self._last_angle = pos
+        return True
+
+    def _velocity_changed(self, vel: meters_per_second) -> bool:
+        last = self._last_velocity
+        if last is not None and abs(vel - last) < constants.swerve_velocity_tolerance and (vel != 0 or last == 0):
+            return False
+        self._last_velocity = vel
+        return True
+
+
 @dataclass
-class TalonFXSwerveNode(SwerveNode):
+class TalonFXSwerveNode(OptimizedSwerveNode):
     m_move: TalonFX
     m_turn: TalonFX
     encoder: CANCoder
@@ -61,24 +109,27 @@ class TalonFXSwerveNode(SwerveNode):
         current_absolute_pos_radians = math.radians(self.encoder.getAbsolutePosition())
         new_sensor_pos_radians = current_absolute_pos_radians - self.encoder_zeroed_absolute_pos_radians
         self.m_turn.set_sensor_position(new_sensor_pos_radians * constants.drivetrain_turn_gear_ratio)
+        self._last_angle = None
 
     # reposition the wheels
     def set_motor_angle(self, pos: radians):
-        self.m_turn.set_target_position(pos * constants.drivetrain_turn_gear_ratio)
+        if self._angle_changed(pos):
+            self.m_turn.set_target_position(pos * constants.drivetrain_turn_gear_ratio)
 
     def get_current_motor_angle(self) -> radians:
         return self.m_turn.get_sensor_position() / constants.drivetrain_turn_gear_ratio
 
     # rotate the wheel so the robot moves
     def set_motor_velocity(self, vel: meters_per_second):
-        self.m_move.set_target_velocity(vel * constants.drivetrain_move_gear_ratio)
+        if self._velocity_changed(vel):
+            self.m_move.set_target_velocity(vel * constants.drivetrain_move_gear_ratio)
 
     def get_motor_velocity(self) -> radians_per_second:
         return self.m_move.get_sensor_velocity() / constants.drivetrain_move_gear_ratio
 
 
 @dataclass
-class ManuallyZeroedSwerveNode(SwerveNode):
+class ManuallyZeroedSwerveNode(OptimizedSwerveNode):
     m_move: TalonFX
     m_turn: TalonFX
     # encoder: CANCoder
@@ -97,17 +148,20 @@ class ManuallyZeroedSwerveNode(SwerveNode):
         # current_absolute_pos_radians = self.encoder.getAbsolutePosition() * deg
         # new_sensor_pos_radians = current_absolute_pos_radians - self.encoder_zeroed_absolute_pos_radians
         self.m_turn.set_sensor_position(0 * constants.drivetrain_turn_gear_ratio)
+        self._last_angle = None
 
     # reposition the wheels
     def set_motor_angle(self, pos: radians):
-        self.m_turn.set_target_position(pos * constants.drivetrain_turn_gear_ratio)
+        if self._angle_changed(pos):
+            self.m_turn.set_target_position(pos * constants.drivetrain_turn_gear_ratio)
 
     def get_current_motor_angle(self) -> radians:
         return self.m_turn.get_sensor_position() / constants.drivetrain_turn_gear_ratio
 
     # rotate the wheel so the robot moves
     def set_motor_velocity(self, vel: meters_per_second):
-        self.m_move.set_target_velocity(vel * constants.drivetrain_move_gear_ratio)
+        if self._velocity_changed(vel):
+            self.m_move.set_target_velocity(vel * constants.drivetrain_move_gear_ratio)
 
     def get_motor_velocity(self) -> meters_per_second:
         return self.m_move.get_sensor_velocity() / constants.drivetrain_move_gear_ratio
@@ -162,3 +216,90 @@ class Drivetrain(SwerveDrivetrain):
     deadzone_velocity: meters_per_second = 0.01
     deadzone_angular_velocity: radians_per_second = (5 * deg/s).asNumber(rad/s)
     start_pose: Pose2d = Pose2d(0, 0, 0)
+
+    temperature_period = 50  # ticks between motor temperature reads, they change slowly
+
+    def init(self):
+        super().init()
+        self.nodes = (self.n_00, self.n_01, self.n_10, self.n_11)
+        half = .5 * self.track_width
+        # Same module order and positions as the toolkit's SwerveDrive4Kinematics
+        self.swerve_kinematics = SwerveKinematics([(-half, -half), (-half, half), (half, -half), (half, half)])
+        self.temperatures = (0.0,) * 4
+        self.temperature_ticks = 0
+        self.snapshot = SwerveSnapshot(0, 0, 0, 0, (0.0,) * 4, (0.0,) * 4, self.temperatures, self.start_pose)
+        self.chassis_speeds = ChassisSpeeds(0, 0, 0)
+
+        self.odometry_lock = threading.Lock()  # odometry is updated from the notifier thread
+        self.odometry_notifier = None
+
+    def start_odometry_thread(self):
+        '''
+        Integrates odometry every constants.odometry_period on a Notifier instead of from set_driver_centric.
+        The drive Talon and Pigeon2 feedback frames are sped up to match so each update sees new speeds and
+        heading, about 1000 frames/s on the bus at 5ms. The turn Talons stay at 20ms, module angles change
+        slowly next to the speeds and speeding them up too would take it to about 1800 frames/s.
+        '''
+        if self.odometry_notifier is not None:
+            return
+        frame_ms = int(constants.odometry_period * 1000)
+        for node in self.nodes:
+            node.m_move._motor.setStatusFramePeriod(StatusFrameEnhanced.Status_2_Feedback0, frame_ms, 0)
+        self.gyro._gyro.setStatusFramePeriod(PigeonIMU_StatusFrame.PigeonIMU_CondStatus_9_SixDeg_YPR, frame_ms, 0)
+
+        self.odometry_notifier = wpilib.Notifier(self.update_snapshot)
+        self.odometry_notifier.startPeriodic(constants.odometry_period)
+
+    def get_pose(self) -> Pose2d:
+        return self.snapshot.pose
+
+    def reset_odometry(self, pose: Pose2d, rotation: Rotation2d):
+        with self.odometry_lock:
+            self.odometry.resetPosition(pose, rotation)
+            s = self.snapshot
+            self.snapshot = SwerveSnapshot(
+                s.timestamp, s.vx, s.vy, s.omega, s.speeds, s.angles, s.temperatures, self.odometry.getPose()
+            )
+
+    def periodic(self):
+        if self.temperature_ticks <= 0:
+            self.temperatures = tuple(node.m_move._motor.getTemperature() for node in self.nodes)
+            self.temperature_ticks = self.temperature_period
+        self.temperature_ticks -= 1
+
+    def set_driver_centric(self, vel: (meters_per_second, meters_per_second), angular_vel: radians_per_second):
+        self._omega = angular_vel  # For simulation
+
+        if abs(vel[0]) < self.deadzone_velocity and abs(vel[1]) < self.deadzone_velocity and \
+                abs(angular_vel) < self.deadzone_angular_velocity:
+            for node in self.nodes:
+                node.set_motor_velocity(0)
+        else:
+            k = self.swerve_kinematics
+            k.inverse(vel[0], vel[1], angular_vel, constants.drivetrain_max_module_vel)
+            for node, speed, angle in zip(self.nodes, k.speeds, k.angles):
+                node.set(speed, angle)
+
+        if self.odometry_notifier is None:
+            self.update_snapshot()
+
+    def update_snapshot(self):
+        '''
+        Reads every module and the gyro once, then odometry and chassis_speeds come from the same readings.
+        Runs on the odometry notifier once it's started, so the snapshot is replaced whole rather than edited.
+        '''
+        speeds = [node.get_motor_velocity() for node in self.nodes]
+        angles = [node.get_current_motor_angle() for node in self.nodes]
+        heading = Rotation2d(self.gyro.get_robot_heading())
+
+        vx, vy, omega = self.swerve_kinematics.forward(speeds, angles)
+
+        # Published under the lock so a reset_odometry can't be overwritten by a pose from before it
+        with self.odometry_lock:
+            pose = self.odometry.update(
+                heading, *(SwerveModuleState(speed, Rotation2d(angle)) for speed, angle in zip(speeds, angles))
+            )
+            self.snapshot = SwerveSnapshot(
+                wpilib.Timer.getFPGATimestamp(), vx, vy, omega, tuple(speeds), tuple(angles), self.temperatures, pose
+            )
+            self.chassis_speeds = ChassisSpeeds(vx, vy, omega)
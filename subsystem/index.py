@@ -14,9 +14,11 @@ class Index(Subsystem):
     # motor: TalonFX = TalonFX(16, inverted=False, config=_MOTOR_CFG)
     left_dinglebob: TalonFX = TalonFX(22, inverted=False, config=_MOTOR_CFG)
     right_dinglebob: TalonFX = TalonFX(19, inverted=False, config=_MOTOR_CFG)
-    photo_electric = LimitSwitch(0)
-    left_limit = LimitSwitch(3)
-    right_limit = LimitSwitch(5)
+    photo_electric = LimitSwitch(0, debounce=constants.index_photo_electric_debounce, release_debounce=0)
+    left_limit = LimitSwitch(3, debounce=constants.index_limit_debounce,
+                             release_debounce=constants.index_limit_release_debounce)
+    right_limit = LimitSwitch(5, debounce=constants.index_limit_debounce,
+                              release_debounce=constants.index_limit_release_debounce)
     #ctre.BaseTalon.getSupplyCurrent #input
     #ctre.BaseTalon.getStatorCurrent #output
     left_dinglebob_in: bool
@@ -27,10 +29,6 @@ class Index(Subsystem):
     staged_oc = False
     traffic_oc = False
 
-    RDB = 0
-
-    LDB = 0
-
     ball_count = 0
 
     shooting = False
@@ -51,6 +49,10 @@ class Index(Subsystem):
         self.right_dinglebob.init()
         optimize_normal_talon_no_sensor(self.left_dinglebob)
         optimize_normal_talon_no_sensor(self.right_dinglebob)
+        if constants.index_sensor_interrupts:
+            self.photo_electric.enable_interrupts()
+            self.left_limit.enable_interrupts()
+            self.right_limit.enable_interrupts()
         self.ball_queue = 0
         self.running = False
         self.refresh = False
@@ -71,6 +73,12 @@ class Index(Subsystem):
         self.dinglebob_run_extend = False
         
 
+    def periodic(self):
+        # One read of each index sensor per tick, everything else uses the debounced values
+        self.photo_electric.update()
+        self.left_limit.update()
+        self.right_limit.update()
+
     def set(self, motor_speed: float):
         # TODO Velocity control
         self.motor.set_raw_output(motor_speed)
@@ -100,14 +108,10 @@ class Index(Subsystem):
         self.right_dinglebob_in = True
 
     def isLeftLimit(self):
-        if self.left_limit.get_value():
-            return True
-        return False
+        return self.left_limit.value
 
     def isRightLimit(self):
-        if self.right_limit.get_value():
-            return True
-        return False
+        return self.right_limit.value
 
     def dinglebob_eject_left(self):
         self.left_dinglebob.set_raw_output(self.dinglebob_eject_speed)
@@ -3,11 +3,12 @@ import math
 import ctre
 from robotpy_toolkit_7407 import Subsystem
 from robotpy_toolkit_7407.motors import TalonFX, TalonConfig, ctre_motors
-from robotpy_toolkit_7407.utils.units import rad, deg, radians, meters_per_second, m, s
+from robotpy_toolkit_7407.utils.units import rad, deg, radians, meters_per_second, radians_per_second
 
 import constants
 from sensors import LimitSwitch
 from utils.can_optimizations import optimize_normal_talon
+from utils.flywheel_model import FlywheelModel, ShotLog
 from utils.shooter_targeting import ShooterTargeting
 
 from robotpy_toolkit_7407.motors.ctre_motors import talon_sensor_unit
@@ -29,7 +30,7 @@ class Shooter(Subsystem):
 
     m_turret = TalonFX(20, inverted=False, config=TalonConfig(
         k_P=.2, k_I=0, k_D=0, k_F=1023 / 20101, integral_zone=10000, max_integral_accumulator=100000,
-        neutral_brake=True, motion_cruise_velocity=12000 * ctre_motors.k_sensor_vel_to_rad_per_sec,
+        neutral_brake=True, motion_cruise_velocity=constants.turret_motion_cruise_velocity * ctre_motors.k_sensor_vel_to_rad_per_sec,
         motion_acceleration=max_turret_accel * ctre_motors.k_sensor_accel_to_rad_per_sec_sq))
 
     # BEST ACCELERATION FOR TURRET Position PID IS 100000
@@ -41,8 +42,6 @@ class Shooter(Subsystem):
     angle_range = (45 * deg).asNumber(rad)
     turret_range = (236 * deg).asNumber(rad)
 
-    max_turret_turn_velocity = 1 * m / s
-
     left_limit = LimitSwitch(1)
 
     mag_sensor = LimitSwitch(8)
@@ -96,6 +95,13 @@ class Shooter(Subsystem):
 
         self.auto_finished = True
 
+        self.flywheel_model = FlywheelModel.load()
+        self.shot_log = ShotLog()
+        # Last commanded shot, for the shot log
+        self.target_distance = None
+        self.launch_angle = 0
+        self.exit_velocity = 0
+
     def set_launch_angle(self, theta: radians):
         theta = math.radians(90) - theta - self.sensor_zero_angle
         print("TARGET ANGLE: ", theta * constants.shooter_angle_gear_ratio)
@@ -110,11 +116,9 @@ class Shooter(Subsystem):
     def get_turret_rotation_angle(self):
         return self.m_turret.get_sensor_position() / constants.turret_angle_gear_ratio
 
-    def set_turret_rotation_velocity(self, vel: meters_per_second):
-        if abs(vel) > self.max_turret_turn_velocity:
-            self.m_turret.set_target_velocity(self.max_turret_turn_velocity * constants.turret_angle_gear_ratio)
-        else:
-            self.m_turret.set_target_velocity(vel * constants.turret_angle_gear_ratio)
+    def set_turret_rotation_velocity(self, vel: radians_per_second):
+        vel = max(min(vel, constants.turret_max_velocity), -constants.turret_max_velocity)
+        self.m_turret.set_target_velocity(vel * constants.turret_angle_gear_ratio)
 
     def set_flywheels(self, top_vel: meters_per_second, bottom_vel: meters_per_second):
         self.desired_m_top = top_vel * constants.shooter_top_gear_ratio
@@ -127,22 +131,27 @@ class Shooter(Subsystem):
 
     def set_flywheels_for_ball_velocity(self, vx: meters_per_second, vy: meters_per_second):
         self.prev_flywheel_vel = (vx, vy)
-        final_velocity = (-0.286 + 1.475 * (vx ** 2 + vy ** 2) ** .5)
+        exit_velocity = (vx ** 2 + vy ** 2) ** .5
         final_angle = math.atan(vy / vx)
         # print("FINAL ANGLE: ", final_angle)
+        self.launch_angle = final_angle
+        self.exit_velocity = exit_velocity
         self.set_launch_angle(final_angle)
-        self.set_flywheels(final_velocity, final_velocity)
+        self.set_flywheels(
+            self.flywheel_model.wheel_speed("top", exit_velocity, final_angle),
+            self.flywheel_model.wheel_speed("bottom", exit_velocity, final_angle)
+        )
 
     def get_current_ball_exit_velocity(self) -> tuple[meters_per_second, meters_per_second]:
         v1 = self.m_top.get_sensor_velocity() / constants.shooter_top_gear_ratio
         v2 = self.m_bottom.get_sensor_velocity() / constants.shooter_bottom_gear_ratio
-        v = 0.5 * (v1 + v2)
-        v_adj = (v + 0.286) / 1.475
         sensor_theta = self.m_angle.get_sensor_position() / constants.shooter_angle_gear_ratio
         launch_angle = math.radians(90) - sensor_theta - self.sensor_zero_angle
+        v_adj = self.flywheel_model.exit_velocity(v1, v2, launch_angle)
         return v_adj * math.cos(launch_angle), v_adj * math.sin(launch_angle)
 
     def target_stationary(self, limelight_dist):
+        self.target_distance = limelight_dist
         limelight_dist += constants.limelight_horizontal_adjustment
         vx, vy = ShooterTargeting.stationary_aim(limelight_dist)
         self.set_flywheels_for_ball_velocity(vx, vy)
@@ -0,0 +1,331 @@
+'''
+    Property tests and a benchmark for BallPath.
+
+    Robot.index, Robot.intake, the color sensors and the PDH/shot services are swapped for fakes
+    driven by a small model of the index: balls roll in at random on whichever intake is down,
+    take a few ticks to move between slots, and get shot while the shooter says it's ready.
+'''
+
+import random
+import statistics
+import time
+from collections import deque
+
+import commands2
+import pytest
+
+import command.ballpath as ballpath
+import config
+import constants
+from robot_systems import Robot, Sensors
+from utils import index_state_machine as ism
+
+TRAVEL_TICKS = 4  # ticks a ball takes to move between slots
+SLOTS = ("Left", "Right", "Stage")
+
+
+class FakeSwitch:
+    def __init__(self):
+        self.pressed = False
+        self.value = False
+        self.rising = False
+        self.falling = False
+        self.pressed_edge = False
+        self.on_press = None
+
+    def get_value(self):
+        return self.pressed
+
+    def update(self):
+        # Same outputs as LimitSwitch.update with no debounce
+        self.rising = self.pressed and not self.value
+        self.falling = self.value and not self.pressed
+        self.pressed_edge = self.rising
+        self.value = self.pressed
+
+
+class FakeMotor:
+    def set_raw_output(self, x):
+        pass
+
+
+class FakeIndex(commands2.SubsystemBase):
+    def __init__(self, world):
+        super().__init__()
+        self.world = world
+        self.photo_electric = FakeSwitch()
+        self.left_limit = FakeSwitch()
+        self.right_limit = FakeSwitch()
+        self.left_oc = False
+        self.right_oc = False
+        self.staged_oc = False
+        self.traffic_oc = False
+        self.ball_count = 0
+        self.shooting = False
+        self.autoShotToggle = False
+        self.autoShoot = False
+        self.stage = False
+        self.resetBall = False
+        self.destageBall = False
+        self.aiming = False
+
+    def moveBall(self, Dir, pos="none"):
+        self.world.command_move(pos, Dir)
+
+    def intakeBall(self, pos, Dir):
+        pass
+
+    def dinglebobs_off(self):
+        pass
+
+    def single_dinglebob_off(self, Dir):
+        pass
+
+    def single_dinglebob_in(self, Dir):
+        pass
+
+    def single_dinglebob_out(self, Dir):
+        pass
+
+    def dinglebobs_control(self, Dir, Pos="none"):
+        pass
+
+
+class FakeIntake:
+    def __init__(self):
+        self.left_intake_down = False
+        self.right_intake_down = False
+        self.left_current = False
+        self.right_current = False
+        self.left_intake_speed = constants.default_intake_speed
+        self.right_intake_speed = constants.default_intake_speed
+        self.left_intake_motor = FakeMotor()
+        self.right_intake_motor = FakeMotor()
+
+
+class FakeShooter:
+    ready = False
+
+
+class FakeColorSensors:
+    def __init__(self, world):
+        self.world = world
+        self.working = True
+
+    def left_color(self):
+        return self.world.balls["Left"] or "none"
+
+    def right_color(self):
+        return self.world.balls["Right"] or "none"
+
+    def left_val(self):
+        return [1, 1, 1, 1]
+
+    def right_val(self):
+        return [1, 1, 1, 1]
+
+
+class FakePower:
+    def get(self, channel):
+        return 0.0
+
+    def mean(self, channel, n=None):
+        return 0.0
+
+
+class FakeShots:
+    def __init__(self):
+        self.shots = 0
+        self.events = deque()
+
+    def pop_shot(self, since):
+        return self.events.popleft() if self.events else None
+
+
+class FakeFeedScheduler:
+    def record_feed(self, seconds):
+        pass
+
+
+class FakeHaptics:
+    def hold(self, *args, **kwargs):
+        pass
+
+    def play_on(self, *args, **kwargs):
+        pass
+
+
+class FakeAxis:
+    value = 0
+
+
+class FakeKeymap:
+    class Index:
+        LEFT_JOY = FakeAxis()
+        RIGHT_JOY = FakeAxis()
+
+
+class World:
+    '''
+    Where the balls really are. Balls only move when BallPath asks for it.
+    '''
+
+    def __init__(self, rng: random.Random, arrival_chance: float = .03):
+        self.rng = rng
+        self.arrival_chance = arrival_chance
+        self.balls = {slot: None for slot in SLOTS}  # slot -> color
+        self.moving = None  # [from, to, color, ticks left]
+        self.fed = 0
+        self.fired = 0
+        self.tick_count = 0
+
+        self.index = FakeIndex(self)
+        self.intake = FakeIntake()
+        self.shooter = FakeShooter()
+        self.shots = FakeShots()
+
+    def command_move(self, src, dst):
+        if self.moving is not None or self.balls.get(src) is None:
+            return
+        self.moving = [src, dst, self.balls[src], TRAVEL_TICKS]
+        self.balls[src] = None
+
+    def ball_total(self):
+        return sum(1 for c in self.balls.values() if c is not None) + (1 if self.moving is not None else 0)
+
+    def step(self):
+        self.tick_count += 1
+        rng = self.rng
+
+        # Driver inputs change every couple of seconds
+        if self.tick_count % 60 == 0:
+            side = rng.choice(("Left", "Right", None))
+            self.intake.left_intake_down = side == "Left"
+            self.intake.right_intake_down = side == "Right"
+            self.shooter.ready = rng.random() < .4
+            self.index.stage = self.shooter.ready
+
+        if self.moving is not None:
+            self.moving[3] -= 1
+            if self.moving[3] <= 0:
+                src, dst, color, _ = self.moving
+                if dst == "Shoot":
+                    self.fired += 1
+                    self.shots.shots += 1
+                    self.shots.events.append((time.monotonic(), self.fired))
+                    self.moving = None
+                elif self.balls[dst] is None:
+                    self.balls[dst] = color
+                    self.moving = None
+
+        for side, down in (("Left", self.intake.left_intake_down), ("Right", self.intake.right_intake_down)):
+            blocked = self.moving is not None and side in self.moving[:2]
+            if down and not blocked and self.balls[side] is None and self.ball_total() < 3 \
+                    and rng.random() < self.arrival_chance:
+                self.balls[side] = config.TEAM if rng.random() < .7 else "opp"
+                self.fed += 1
+
+        self.index.left_limit.pressed = self.balls["Left"] is not None
+        self.index.right_limit.pressed = self.balls["Right"] is not None
+        self.index.photo_electric.pressed = self.balls["Stage"] is not None
+        for switch in (self.index.photo_electric, self.index.left_limit, self.index.right_limit):
+            switch.update()
+
+
+@pytest.fixture
+def world(monkeypatch):
+    w = World(random.Random(0))
+    monkeypatch.setattr(Robot, "index", w.index, raising=False)
+    monkeypatch.setattr(Robot, "intake", w.intake, raising=False)
+    monkeypatch.setattr(Robot, "shooter", w.shooter, raising=False)
+    monkeypatch.setattr(Robot, "haptics", FakeHaptics(), raising=False)
+    monkeypatch.setattr(Robot, "feed_scheduler", FakeFeedScheduler(), raising=False)
+    monkeypatch.setattr(Sensors, "color_sensors", FakeColorSensors(w), raising=False)
+    monkeypatch.setattr(Sensors, "power", FakePower(), raising=False)
+    monkeypatch.setattr(Sensors, "shots", w.shots, raising=False)
+    monkeypatch.setattr(ballpath, "Keymap", FakeKeymap)
+    return w
+
+
+def run(world, command, ticks, check=None):
+    '''
+    Runs the command against the world
+
+    Returns per tick execute times (s) grouped by balls in the index
+    '''
+    timings = {}
+    for _ in range(ticks):
+        world.step()
+        start = time.perf_counter()
+        command.execute()
+        timings.setdefault(world.ball_total(), []).append(time.perf_counter() - start)
+        if check is not None:
+            check(world, command)
+    return timings
+
+
+def check_state_machine(world, command):
+    state = command.machine.state
+    index = world.index
+    # Occupancy flags mirror the machine
+    assert index.left_oc == (state.left != ism.EMPTY)
+    assert index.right_oc == (state.right != ism.EMPTY)
+    assert index.staged_oc == (state.stage != ism.EMPTY)
+    assert index.traffic_oc == (state.move is not None)
+    # Every ball that came in was counted exactly once
+    assert index.ball_count == world.fed
+    assert command.shot_count == world.fired
+    # The machine agrees with where the balls really are once nothing is moving
+    if state.move is None and world.moving is None:
+        for slot in SLOTS:
+            assert (world.balls[slot] is not None) == (getattr(state, slot.lower()) != ism.EMPTY), slot
+    assert command.machine.ball_count() == world.ball_total()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_state_machine_properties(world, seed):
+    world.rng.seed(seed)
+    world.index.autoShoot = seed % 2 == 0
+    command = ballpath.BallPath(None)
+    run(world, command, 2000, check_state_machine)
+    assert world.fed > 0
+
+
+def test_override_keeps_balls(world, monkeypatch):
+    command = ballpath.BallPath(None)
+    world.balls["Left"] = config.TEAM
+    world.balls["Stage"] = config.TEAM
+    world.step()
+    command.machine.state = ism.IndexState(ism.TEAM, ism.EMPTY, ism.TEAM, None)
+
+    # Held for a few ticks, the machine keeps its balls instead of resetting every tick
+    monkeypatch.setattr(FakeKeymap.Index.LEFT_JOY, "value", 1)
+    for _ in range(3):
+        command.execute()
+    assert command.machine.ball_count() == 2
+
+    # The operator moved the left ball across by hand, the machine picks it up from the sensors
+    world.balls["Left"], world.balls["Right"] = None, config.TEAM
+    world.step()
+    monkeypatch.setattr(FakeKeymap.Index.LEFT_JOY, "value", 0)
+    command.execute()
+    assert command.machine.state.left == ism.EMPTY
+    assert command.machine.state.right == ism.TEAM
+    assert command.machine.state.stage == ism.TEAM
+
+
+def test_execute_time(world):
+    # One full match (2:30) of ticks, execute has to fit well inside the loop period
+    world.index.autoShoot = True
+    world.arrival_chance = .1
+    command = ballpath.BallPath(None)
+    timings = run(world, command, int(150 / constants.period))
+
+    # Captured by pytest, run with -s to see the table
+    print("\nBallPath execute time by balls in index (ms):")
+    for count in sorted(timings):
+        t = timings[count]
+        print(f"  {count} balls: n={len(t):5d} mean={statistics.mean(t) * 1000:.3f} "
+              f"p99={sorted(t)[int(len(t) * .99)] * 1000:.3f} max={max(t) * 1000:.3f}")
+    all_times = [t for ts in timings.values() for t in ts]
+    assert statistics.mean(all_times) < constants.period / 10
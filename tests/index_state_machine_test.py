@@ -0,0 +1,56 @@
+'''
+    Tests for the table driven index model in utils/index_state_machine.py
+'''
+
+from utils import index_state_machine as ism
+
+
+def test_team_ball_goes_to_far_side():
+    machine = ism.IndexStateMachine()
+    machine.dispatch(ism.LEFT_ENTRY_TEAM, ism.INTAKE_LEFT)
+    actions = machine.dispatch(ism.IDLE, ism.INTAKE_LEFT)
+    assert ("move", "Left", "Right") in actions
+    assert machine.state == ism.IndexState(ism.EMPTY, ism.TEAM, ism.EMPTY, ("Left", "Right"))
+
+    machine.dispatch(ism.RIGHT_LIMIT, ism.INTAKE_LEFT)
+    assert machine.state.move is None
+    assert machine.ball_count() == 1
+
+
+def test_entry_on_filled_slot_is_ignored():
+    machine = ism.IndexStateMachine()
+    machine.dispatch(ism.LEFT_ENTRY_TEAM, ism.INTAKE_LEFT)
+    before = machine.state
+    assert machine.dispatch(ism.LEFT_ENTRY_OPP, ism.INTAKE_LEFT) == ()
+    assert machine.state == before
+
+
+def test_stage_skips_opponent_balls():
+    machine = ism.IndexStateMachine()
+    machine.state = ism.IndexState(ism.OPP, ism.EMPTY, ism.EMPTY, None)
+    assert machine.dispatch(ism.STAGE) == ()
+    assert machine.state.stage == ism.EMPTY
+
+    machine.state = ism.IndexState(ism.OPP, ism.TEAM, ism.EMPTY, None)
+    assert machine.dispatch(ism.STAGE) == (("move", "Right", "Stage"),)
+
+
+def test_shoot_and_reset():
+    machine = ism.IndexStateMachine()
+    machine.state = ism.IndexState(ism.EMPTY, ism.TEAM, ism.TEAM, None)
+    assert machine.dispatch(ism.SHOOTER_READY) == (("move", "Stage", "Shoot"),)
+    assert machine.ball_count() == 2
+    machine.dispatch(ism.SHOT)
+    assert machine.state == ism.IndexState(ism.EMPTY, ism.TEAM, ism.EMPTY, None)
+
+    assert machine.dispatch(ism.RESET) == (("stop",),)
+    assert machine.state == ism.EMPTY_STATE
+
+
+def test_one_ball_moves_at_a_time():
+    for (state, event, intake), (new, actions) in ism.TRANSITIONS.items():
+        moves = [action for action in actions if action[0] == "move"]
+        assert len(moves) <= 1
+        if state.move is not None and event not in ism.ENTRY_EVENTS:
+            # Only an arrival or a reset ends a move
+            assert new.move is None or new.move == state.move
@@ -0,0 +1,112 @@
+import math
+
+
+class FeedScheduler:
+    '''
+    Predicts when the flywheels will be back in tolerance after a shot, from recovery curves measured
+    on earlier shots, so the staged ball can be fed early and reach the wheels just as they're ready.
+
+    Recovery is modelled per wheel as an exponential decay of the velocity error:
+        error(t) = error(0) * e^(-t / tau)
+    '''
+
+    tolerance = .05  # fraction of setpoint, same band TurretAim used
+    feed_band = .15  # fraction of setpoint the wheels have to be within before an early feed, in case the prediction is off
+    default_tau = .25  # s, until a recovery has been measured
+    min_tau = .05
+    max_tau = 2
+    learn_rate = .3  # how much each measured recovery moves the estimates
+    recovery_timeout = 1.5  # s, a recovery that takes longer than this isn't learned from
+
+    default_feed_time = .1  # s from starting the stage -> shoot feed to the ball hitting the wheels
+    min_feed_time = 0
+    max_feed_time = .5
+
+    def __init__(self, wheels: int = 2):
+        '''
+        :Param int wheels: number of flywheels (m_top and m_bottom)
+        '''
+        self.wheels = wheels
+        self.tau = [self.default_tau] * wheels
+        self.error = [1.0] * wheels
+        self.feed_time = self.default_feed_time
+
+        self.desired = [0.0] * wheels
+        self.recovery_start = None
+        self.recovery = [[] for _ in range(wheels)]  # (seconds since shot, error) while recovering
+        self.ready_time = None  # predicted time every wheel is in tolerance
+
+    def update(self, now: float, velocities: list[float], desired: list[float], shot: bool):
+        '''
+        Called once per tick
+
+        :Param float now: timestamp (s)
+
+        :Param list[float] velocities: measured velocity of each wheel
+
+        :Param list[float] desired: setpoint of each wheel, same units
+
+        :Param bool shot: a shot was detected this tick
+        '''
+        self.error = [abs(d - v) / d if d > 0 else 1.0 for v, d in zip(velocities, desired)]
+
+        setpoint_changed = any(abs(d - last) > self.tolerance * max(abs(last), 1e-6)
+                               for d, last in zip(desired, self.desired))
+        self.desired = list(desired)
+
+        if shot:
+            self.recovery_start = now
+            self.recovery = [[] for _ in range(self.wheels)]
+        elif self.recovery_start is not None and (setpoint_changed or now - self.recovery_start > self.recovery_timeout):
+            # Chasing a new setpoint or never settling, not a recovery curve
+            self.recovery_start = None
+
+        if self.recovery_start is not None:
+            for i, err in enumerate(self.error):
+                self.recovery[i].append((now - self.recovery_start, err))
+            if all(err <= self.tolerance for err in self.error):
+                self._learn_recovery()
+                self.recovery_start = None
+
+        if any(d <= 0 for d in desired):
+            self.ready_time = None
+        else:
+            self.ready_time = now + max(self.time_to_ready(i) for i in range(self.wheels))
+
+    def _learn_recovery(self):
+        # Least squares fit of ln(error) against time for each wheel, slope is -1/tau
+        for i, samples in enumerate(self.recovery):
+            points = [(t, math.log(err)) for t, err in samples if err > 0]
+            # Start from the deepest point of the dip, before that the ball is still in the wheels
+            if len(points) < 2:
+                continue
+            deepest = max(range(len(points)), key=lambda k: points[k][1])
+            points = points[deepest:]
+            if len(points) < 2:
+                continue
+            t_mean = sum(t for t, _ in points) / len(points)
+            l_mean = sum(l for _, l in points) / len(points)
+            den = sum((t - t_mean) ** 2 for t, _ in points)
+            if den <= 0:
+                continue
+            slope = sum((t - t_mean) * (l - l_mean) for t, l in points) / den
+            if slope >= 0:
+                continue
+            tau = min(max(-1 / slope, self.min_tau), self.max_tau)
+            self.tau[i] += self.learn_rate * (tau - self.tau[i])
+
+    def time_to_ready(self, wheel: int) -> float:
+        err = self.error[wheel]
+        if err <= self.tolerance:
+            return 0.0
+        return self.tau[wheel] * math.log(err / self.tolerance)
+
+    def should_feed(self, now: float) -> bool:
+        # True once feeding now gets the ball to the wheels no earlier than they're in tolerance,
+        # and the wheels are already close enough that a bad prediction can't feed into a deep dip
+        return (self.ready_time is not None and now + self.feed_time >= self.ready_time
+                and max(self.error) <= self.feed_band)
+
+    def record_feed(self, seconds: float):
+        seconds = min(max(seconds, self.min_feed_time), self.max_feed_time)
+        self.feed_time += self.learn_rate * (seconds - self.feed_time)
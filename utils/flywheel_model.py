@@ -0,0 +1,206 @@
+import csv
+import json
+import os
+
+import constants
+
+MODEL_FILE = os.path.join(os.path.dirname(__file__), "flywheel_model.json")
+SHOT_LOG_FILE = os.path.join(os.path.dirname(__file__), "flywheel_shots.csv")
+
+WHEELS = ("top", "bottom")
+
+
+class FlywheelModel:
+    '''
+    Flywheel speed needed for a ball exit velocity, fit per wheel at evenly spaced launch angles:
+        wheel_speed = a + b * exit_velocity
+    Angles in between interpolate the two nearest fits, so a lookup is an index and a few multiplies.
+    Starts from the old fixed map (-0.286 + 1.475 * v) for both wheels until fit from logged shots.
+    '''
+
+    default_fit = (-0.286, 1.475)
+    min_angle = constants.minimum_shooter_angle
+    max_angle = constants.max_shooter_angle
+    bins = 7  # fits across the launch angle range
+    min_samples = 3  # made shots near an angle before its fit is replaced
+
+    def __init__(self):
+        self.step = (self.max_angle - self.min_angle) / (self.bins - 1)
+        self.fits = {wheel: [self.default_fit] * self.bins for wheel in WHEELS}
+
+    def _bin(self, angle: float) -> tuple[int, float]:
+        # Lower fit index and how far toward the next one
+        x = (angle - self.min_angle) / self.step
+        x = max(min(x, self.bins - 1), 0)
+        i = min(int(x), self.bins - 2)
+        return i, x - i
+
+    def _fit_at(self, wheel: str, angle: float) -> tuple[float, float]:
+        i, t = self._bin(angle)
+        (a0, b0), (a1, b1) = self.fits[wheel][i], self.fits[wheel][i + 1]
+        return a0 + (a1 - a0) * t, b0 + (b1 - b0) * t
+
+    def wheel_speed(self, wheel: str, exit_velocity: float, angle: float) -> float:
+        '''
+        :Param str wheel: "top" or "bottom"
+
+        :Param float exit_velocity: ball exit velocity (m/s)
+
+        :Param float angle: launch angle (rad)
+
+        Returns the flywheel speed to give Shooter.set_flywheels (m/s)
+        '''
+        a, b = self._fit_at(wheel, angle)
+        return a + b * exit_velocity
+
+    def exit_velocity(self, top_speed: float, bottom_speed: float, angle: float) -> float:
+        # Inverse of wheel_speed, averaged over both wheels
+        total = 0.
+        for wheel, speed in zip(WHEELS, (top_speed, bottom_speed)):
+            a, b = self._fit_at(wheel, angle)
+            total += (speed - a) / b
+        return total / len(WHEELS)
+
+    def fit(self, samples: list[tuple[float, float, float, float]]):
+        '''
+        Least squares fit of each wheel at each angle, samples weighted by how close their angle is
+
+        :Param list samples: (launch angle, exit velocity, top speed, bottom speed) of shots that went in
+        '''
+        for k in range(self.bins):
+            center = self.min_angle + k * self.step
+            weighted = [
+                (1 - abs(angle - center) / self.step, v, speeds)
+                for angle, v, *speeds in samples
+                if abs(angle - center) < self.step
+            ]
+            if len(weighted) < self.min_samples:
+                continue
+            w_total = sum(w for w, _, _ in weighted)
+            v_mean = sum(w * v for w, v, _ in weighted) / w_total
+            den = sum(w * (v - v_mean) ** 2 for w, v, _ in weighted)
+            if den < 1e-6:
+                # Every shot at the same velocity, can't tell the slope from the offset
+                continue
+            for i, wheel in enumerate(WHEELS):
+                s_mean = sum(w * s[i] for w, _, s in weighted) / w_total
+                b = sum(w * (v - v_mean) * (s[i] - s_mean) for w, v, s in weighted) / den
+                if b <= 0:
+                    continue
+                self.fits[wheel][k] = (s_mean - b * v_mean, b)
+
+    def save(self, path: str = MODEL_FILE):
+        with open(path, "w") as f:
+            json.dump({"min_angle": self.min_angle, "max_angle": self.max_angle, "fits": self.fits}, f)
+
+    @classmethod
+    def load(cls, path: str = MODEL_FILE) -> "FlywheelModel":
+        # Falls back to the default fit if there's no saved model, or it was made for different angles
+        model = cls()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return model
+        if data.get("min_angle") != model.min_angle or data.get("max_angle") != model.max_angle:
+            return model
+        for wheel in WHEELS:
+            fits = data["fits"].get(wheel, [])
+            if len(fits) == model.bins:
+                model.fits[wheel] = [tuple(fit) for fit in fits]
+        return model
+
+
+class ShotLog:
+    '''
+    Records commanded vs measured flywheel speeds for every detected shot, and what happened to it.
+    Made shots are the samples FlywheelModel.fit uses.
+    '''
+
+    outcomes = ("made", "short", "long", "left", "right")
+    fields = ("time", "distance", "angle", "exit_velocity", "top_desired", "bottom_desired",
+              "top_speed", "bottom_speed", "outcome")
+
+    def __init__(self):
+        self.shots: list[dict] = []
+        self.last_speeds = None  # measured speeds from the tick before, the shot itself pulls them down
+
+    def update(self, now: float, shot: bool, distance: float | None, angle: float, exit_velocity: float,
+               desired: tuple[float, float], speeds: tuple[float, float]):
+        '''
+        Called once per tick
+
+        :Param float angle: commanded launch angle (rad)
+
+        :Param float exit_velocity: commanded exit velocity (m/s)
+
+        :Param tuple desired: commanded (top, bottom) flywheel speed (m/s)
+
+        :Param tuple speeds: measured (top, bottom) flywheel speed (m/s)
+        '''
+        if shot and self.last_speeds is not None:
+            self.shots.append({
+                "time": now, "distance": distance, "angle": angle, "exit_velocity": exit_velocity,
+                "top_desired": desired[0], "bottom_desired": desired[1],
+                "top_speed": self.last_speeds[0], "bottom_speed": self.last_speeds[1],
+                "outcome": None,
+            })
+        self.last_speeds = speeds
+
+    def label_last(self, outcome: str) -> bool:
+        # Marks the latest unlabeled shot, returns False if there wasn't one
+        for shot in reversed(self.shots):
+            if shot["outcome"] is None:
+                shot["outcome"] = outcome
+                return True
+        return False
+
+    def samples(self) -> list[tuple[float, float, float, float]]:
+        return [
+            (s["angle"], s["exit_velocity"], s["top_speed"], s["bottom_speed"])
+            for s in self.shots if s["outcome"] == "made"
+        ]
+
+    def save(self, path: str = SHOT_LOG_FILE):
+        # Appends, so the log keeps growing across sessions for fitting offline
+        new = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.fields)
+            if new:
+                writer.writeheader()
+            writer.writerows(self.shots)
+        self.shots = []
+
+    @classmethod
+    def read(cls, path: str = SHOT_LOG_FILE) -> list[dict]:
+        try:
+            with open(path, newline="") as f:
+                rows = list(csv.DictReader(f))
+        except OSError:
+            return []
+        for row in rows:
+            for field in cls.fields:
+                if field != "outcome":
+                    row[field] = float(row[field]) if row[field] not in ("", "None") else None
+            row["outcome"] = row["outcome"] or None
+        return rows
+
+
+def fit_from_log(path: str = SHOT_LOG_FILE, model_path: str = MODEL_FILE) -> FlywheelModel:
+    '''
+    Fits a model to every made shot in the log and saves it
+    '''
+    model = FlywheelModel.load(model_path)
+    rows = ShotLog.read(path)
+    model.fit([
+        (r["angle"], r["exit_velocity"], r["top_speed"], r["bottom_speed"])
+        for r in rows if r["outcome"] == "made"
+    ])
+    model.save(model_path)
+    return model
+
+
+if __name__ == "__main__":
+    fitted = fit_from_log()
+    for wheel_name in WHEELS:
+        print(wheel_name, [tuple(round(c, 3) for c in fit) for fit in fitted.fits[wheel_name]])
@@ -0,0 +1,247 @@
+from collections import namedtuple
+from itertools import product
+
+# What is in each index slot
+EMPTY = "empty"
+TEAM = "team"
+OPP = "opp"
+CONTENTS = (EMPTY, TEAM, OPP)
+
+SLOTS = ("Left", "Right", "Stage")
+
+# A move is (from, to). The ball is recorded at its destination as soon as it starts moving.
+MOVES = (
+    None,
+    ("Left", "Right"), ("Right", "Left"),
+    ("Left", "Stage"), ("Right", "Stage"),
+    ("Stage", "Left"), ("Stage", "Right"),
+    ("Stage", "Shoot"),
+)
+
+IndexState = namedtuple("IndexState", ["left", "right", "stage", "move"])
+EMPTY_STATE = IndexState(EMPTY, EMPTY, EMPTY, None)
+
+# Which intake is down, part of every dispatch
+INTAKE_NONE = "none"
+INTAKE_LEFT = "left"
+INTAKE_RIGHT = "right"
+INTAKE_BOTH = "both"
+INTAKES = (INTAKE_NONE, INTAKE_LEFT, INTAKE_RIGHT, INTAKE_BOTH)
+
+_DOWN_SIDES = {
+    INTAKE_NONE: (),
+    INTAKE_LEFT: ("Left",),
+    INTAKE_RIGHT: ("Right",),
+    INTAKE_BOTH: ("Left", "Right"),
+}
+
+# Events
+LEFT_ENTRY_TEAM = "left_entry_team"  # new ball pressed the left limit while the left intake is down
+LEFT_ENTRY_OPP = "left_entry_opp"
+RIGHT_ENTRY_TEAM = "right_entry_team"
+RIGHT_ENTRY_OPP = "right_entry_opp"
+LEFT_LIMIT = "left_limit"  # moving ball reached the left limit
+RIGHT_LIMIT = "right_limit"
+STAGE_PHOTO = "stage_photo"  # moving ball reached the photo electric sensor
+SHOT = "shot"  # ball left the shooter
+STAGE = "stage"  # driver/auto asked for a ball to be staged
+DESTAGE = "destage"
+SHOOTER_READY = "shooter_ready"
+IDLE = "idle"  # once a tick, routes balls toward where they should be
+RESET = "reset"
+ENTRY_EVENTS = (LEFT_ENTRY_TEAM, LEFT_ENTRY_OPP, RIGHT_ENTRY_TEAM, RIGHT_ENTRY_OPP)
+EVENTS = (
+    LEFT_ENTRY_TEAM, LEFT_ENTRY_OPP, RIGHT_ENTRY_TEAM, RIGHT_ENTRY_OPP,
+    LEFT_LIMIT, RIGHT_LIMIT, STAGE_PHOTO, SHOT,
+    STAGE, DESTAGE, SHOOTER_READY, IDLE, RESET,
+)
+
+# Actions, run by the command in order:
+#   ("move", from, to)      -> Index.moveBall(to, from)
+#   ("stop",)               -> Index.dinglebobs_off()
+#   ("intake", side, dir)   -> Index.intakeBall(side, dir)
+#   ("dinglebob_off", side) -> Index.single_dinglebob_off(side)
+
+_ENTRIES = {
+    LEFT_ENTRY_TEAM: ("Left", TEAM),
+    LEFT_ENTRY_OPP: ("Left", OPP),
+    RIGHT_ENTRY_TEAM: ("Right", TEAM),
+    RIGHT_ENTRY_OPP: ("Right", OPP),
+}
+_ARRIVALS = {
+    LEFT_LIMIT: "Left",
+    RIGHT_LIMIT: "Right",
+    STAGE_PHOTO: "Stage",
+    SHOT: "Shoot",
+}
+
+
+def _get(state, slot):
+    return getattr(state, slot.lower())
+
+
+def _set(state, slot, contents):
+    return state._replace(**{slot.lower(): contents})
+
+
+def _path_clear(state, src, dst):
+    # Side to side moves go through the stage, so it has to be empty too
+    if dst == "Shoot":
+        return True
+    if _get(state, dst) != EMPTY:
+        return False
+    if dst in ("Left", "Right") and src != "Stage" and state.stage != EMPTY:
+        return False
+    return True
+
+
+def _start_move(state, src, dst):
+    if not _path_clear(state, src, dst):
+        return None
+    ball = _get(state, src)
+    new = _set(state, src, EMPTY)
+    if dst != "Shoot":
+        new = _set(new, dst, ball)
+    return new._replace(move=(src, dst)), [("move", src, dst)]
+
+
+def _free_side(state, preferred=("Left", "Right")):
+    for side in preferred:
+        if _get(state, side) == EMPTY:
+            return side
+    return None
+
+
+def _idle_side(state, side):
+    # Clear the intake side, team balls to the far side, opponent balls to the stage
+    ball = _get(state, side)
+    if ball == EMPTY:
+        return state, [("intake", side, "In")]
+    other = "Right" if side == "Left" else "Left"
+    moved = _start_move(state, side, other if ball == TEAM else "Stage")
+    if moved is None:
+        return state, [("dinglebob_off", side)]
+    return moved
+
+
+def _transition(state, event, intake):
+    '''
+    The rules. Only called while building TRANSITIONS.
+
+    Returns (next state, actions), or None if the event does nothing in this state
+    '''
+    if event == RESET:
+        return EMPTY_STATE, [("stop",)]
+
+    if event in _ENTRIES:
+        side, contents = _ENTRIES[event]
+        if _get(state, side) != EMPTY:
+            return None
+        return _set(state, side, contents), []
+
+    if event in _ARRIVALS:
+        if state.move is None or state.move[1] != _ARRIVALS[event]:
+            return None
+        return state._replace(move=None), [("stop",)]
+
+    # Everything below only starts a move, one ball moves at a time
+    if state.move is not None:
+        return None
+
+    if event == IDLE:
+        down = _DOWN_SIDES[intake]
+        actions = [("intake", side, "Off") for side in ("Left", "Right") if side not in down]
+        for side in down:
+            state, side_actions = _idle_side(state, side)
+            actions += side_actions
+            if state.move is not None:
+                break
+        return state, actions
+
+    if event == STAGE:
+        if state.stage == OPP:
+            dst = _free_side(state)
+            return _start_move(state, "Stage", dst) if dst is not None else None
+        if state.stage == EMPTY:
+            # Only team balls, an opponent ball would just be sent back out
+            for side in ("Left", "Right"):
+                if _get(state, side) == TEAM:
+                    return _start_move(state, side, "Stage")
+        return None
+
+    if event == DESTAGE:
+        if state.stage == EMPTY:
+            return None
+        if intake in (INTAKE_LEFT, INTAKE_BOTH):
+            dst = "Right"
+        elif intake == INTAKE_RIGHT:
+            dst = "Left"
+        else:
+            dst = _free_side(state)
+        return _start_move(state, "Stage", dst) if dst is not None else None
+
+    if event == SHOOTER_READY:
+        if state.stage != TEAM:
+            return None
+        return _start_move(state, "Stage", "Shoot")
+
+    return None
+
+
+def _all_states():
+    for left, right, stage, move in product(CONTENTS, CONTENTS, CONTENTS, MOVES):
+        yield IndexState(left, right, stage, move)
+
+
+def _build_transitions():
+    table = {}
+    for state, event, intake in product(_all_states(), EVENTS, INTAKES):
+        result = _transition(state, event, intake)
+        if result is not None:
+            table[(state, event, intake)] = (result[0], tuple(result[1]))
+    return table
+
+
+# (state, event, intake) -> (next state, actions), built once at import
+TRANSITIONS = _build_transitions()
+
+
+class IndexStateMachine:
+    '''
+    Table driven model of the balls in the index. Each dispatch is one dictionary lookup.
+    '''
+
+    def __init__(self):
+        self.state = EMPTY_STATE
+
+    def dispatch(self, event: str, intake: str = INTAKE_NONE) -> tuple:
+        '''
+        Applies an event
+
+        :Param str event: one of EVENTS
+
+        :Param str intake: which intake is down, one of INTAKES
+
+        Returns the actions to run, empty if the event did nothing
+        '''
+        result = TRANSITIONS.get((self.state, event, intake))
+        if result is None:
+            return ()
+        self.state, actions = result
+        return actions
+
+    def replay(self, trace) -> list[IndexState]:
+        '''
+        Runs a recorded trace of (event, intake) pairs, for testing
+
+        Returns the state after each event
+        '''
+        states = []
+        for event, intake in trace:
+            self.dispatch(event, intake)
+            states.append(self.state)
+        return states
+
+    def ball_count(self) -> int:
+        return sum(1 for slot in (self.state.left, self.state.right, self.state.stage) if slot != EMPTY) + \
+            (1 if self.state.move is not None and self.state.move[1] == "Shoot" else 0)
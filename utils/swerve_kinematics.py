@@ -0,0 +1,94 @@
+import math
+from dataclasses import dataclass
+
+from wpimath.geometry import Pose2d
+
+
+@dataclass(frozen=True)
+class SwerveSnapshot:
+    '''
+    Drivetrain state from one read of the sensors, everything else reads this instead of the modules.
+    Replaced whole on each update, take it once per tick so every field comes from the same read.
+    '''
+    timestamp: float
+    vx: float  # robot relative chassis velocity (m/s)
+    vy: float
+    omega: float  # rad/s
+    speeds: tuple[float, ...]  # module speeds (m/s), n_00, n_01, n_10, n_11
+    angles: tuple[float, ...]  # module angles (rad)
+    temperatures: tuple[float, ...]  # drive motor temperatures (C), refreshed slower than the rest
+    pose: Pose2d  # odometry pose after these readings
+
+    @property
+    def mean_temperature(self) -> float:
+        return sum(self.temperatures) / len(self.temperatures)
+
+
+class SwerveKinematics:
+    '''
+    Inverse and forward kinematics for every module at once, into arrays made once up front.
+    '''
+
+    # Lever arm for rotation in the inverse kinematics. The toolkit used this regardless of track width
+    # and the driver tuning (max_angular_vel, the aim pids) is built on it
+    inverse_radius = math.sqrt(2) / 2
+
+    def __init__(self, positions: list[tuple[float, float]]):
+        '''
+        :Param list positions: (x, y) of each module from the robot center (m), in node order
+        '''
+        self.count = len(positions)
+        self.x = [p[0] for p in positions]
+        self.y = [p[1] for p in positions]
+        # Unit tangents for rotating counter clockwise
+        norms = [math.hypot(x, y) for x, y in positions]
+        self.tangent_x = [-y / n for y, n in zip(self.y, norms)]
+        self.tangent_y = [x / n for x, n in zip(self.x, norms)]
+        self.radius_sq = sum(x ** 2 + y ** 2 for x, y in positions)
+        self.module_radius = math.sqrt(self.radius_sq / self.count)  # rms distance of the modules from the center
+
+        self.speeds = [0.0] * self.count
+        self.angles = [0.0] * self.count
+
+    def inverse(self, vx: float, vy: float, omega: float, max_speed: float = None):
+        '''
+        Module speeds and angles for a chassis velocity, written to self.speeds and self.angles
+
+        :Param float max_speed: fastest a module can go (m/s), all modules are scaled down together past it
+        '''
+        r_omega = self.inverse_radius * omega
+        speeds, angles = self.speeds, self.angles
+        for i in range(self.count):
+            sx = vx + r_omega * self.tangent_x[i]
+            sy = vy + r_omega * self.tangent_y[i]
+            speeds[i] = math.hypot(sx, sy)
+            angles[i] = math.atan2(sy, sx)
+
+        if max_speed is not None:
+            fastest = max(speeds)
+            if fastest > max_speed:
+                scale = max_speed / fastest
+                for i in range(self.count):
+                    speeds[i] *= scale
+
+    def commanded_omega(self, omega: float) -> float:
+        '''
+        Angular velocity to give inverse() to really turn at omega (rad/s). inverse() uses inverse_radius
+        as the lever arm, not where the modules are, so the robot turns faster than what it's given
+        '''
+        return omega * self.module_radius / self.inverse_radius
+
+    def forward(self, speeds: list[float], angles: list[float]) -> tuple[float, float, float]:
+        '''
+        Least squares chassis velocity from measured module speeds and angles
+
+        Returns (vx, vy, omega)
+        '''
+        vx = vy = spin = 0.0
+        for i in range(self.count):
+            mx = speeds[i] * math.cos(angles[i])
+            my = speeds[i] * math.sin(angles[i])
+            vx += mx
+            vy += my
+            spin += self.x[i] * my - self.y[i] * mx
+        return vx / self.count, vy / self.count, spin / self.radius_sq
@@ -0,0 +1,189 @@
+import math
+
+from robotpy_toolkit_7407.motors import ctre_motors
+
+import constants
+
+
+class TurretTracker:
+    '''
+    Velocity controller that keeps the turret on the hub.
+    The limelight offset closes the loop, the feedforward cancels how fast the hub sweeps around the
+    robot while the chassis turns and drives, so the offset only has to correct what's left over.
+    '''
+
+    def __init__(self):
+        self.kP = constants.turret_tracking_kP
+        self.max_velocity = constants.turret_max_velocity
+        self.lock_threshold = math.radians(constants.turret_lock_threshold)
+        self.lock_ticks = constants.turret_lock_ticks
+
+        self.locked_count = 0  # ticks in a row inside lock_threshold
+        self.feedforward = 0.0
+        self.output = 0.0
+
+    @staticmethod
+    def hub_bearing_rate(robot_x: float, robot_y: float, heading: float, hub_x: float, hub_y: float,
+                         vx: float, vy: float, omega: float) -> float:
+        '''
+        How fast the hub's bearing changes relative to the chassis, counter clockwise positive
+
+        :Param float heading: robot heading (rad)
+
+        :Param float vx: robot relative velocity (m/s), same frame as ChassisSpeeds
+
+        :Param float omega: chassis angular velocity (rad/s)
+
+        Returns rad/s
+        '''
+        rx, ry = hub_x - robot_x, hub_y - robot_y
+        d2 = rx ** 2 + ry ** 2
+        if d2 < 1e-6:
+            return -omega
+        cos_h, sin_h = math.cos(heading), math.sin(heading)
+        field_vx = vx * cos_h - vy * sin_h
+        field_vy = vx * sin_h + vy * cos_h
+        # Rate of the field bearing to the hub, minus the chassis turning under the turret
+        return (ry * field_vx - rx * field_vy) / d2 - omega
+
+    @property
+    def locked(self) -> bool:
+        return self.locked_count >= self.lock_ticks
+
+    def calculate(self, offset: float | None, bearing_rate: float | None) -> float:
+        '''
+        Called once per tick
+
+        :Param float offset: limelight tx (rad), None if the target isn't seen
+
+        :Param float bearing_rate: from hub_bearing_rate, None without a pose
+
+        Returns turret velocity (rad/s), positive the same way as the turret sensor
+        '''
+        self.feedforward = 0.0 if bearing_rate is None else constants.turret_direction * bearing_rate
+
+        if offset is None:
+            self.locked_count = 0
+            self.output = self.feedforward
+        else:
+            if abs(offset) < self.lock_threshold:
+                self.locked_count += 1
+            else:
+                self.locked_count = 0
+            self.output = self.feedforward + self.kP * offset
+
+        self.output = max(min(self.output, self.max_velocity), -self.max_velocity)
+        return self.output
+
+    def reset(self):
+        self.locked_count = 0
+        self.feedforward = 0.0
+        self.output = 0.0
+
+
+class TurretPlanner:
+    '''
+    Picks the turret angle (degrees) to go to for a hub bearing, inside the soft limits.
+    The range is short of a full turn, so when the hub is going to pass through the dead zone the turret
+    flips to the far limit early enough to be waiting there when the hub comes back into range.
+    '''
+
+    def __init__(self, min_angle: float, max_angle: float):
+        '''
+        :Param float min_angle: lower soft limit (degrees)
+
+        :Param float max_angle: upper soft limit (degrees)
+        '''
+        self.min_angle = min_angle
+        self.max_angle = max_angle
+        self.dead_zone = 360 - (max_angle - min_angle)
+
+        # Positional pid profile in turret degrees
+        self.max_velocity = math.degrees(
+            constants.turret_motion_cruise_velocity * ctre_motors.k_sensor_vel_to_rad_per_sec
+            / constants.turret_angle_gear_ratio
+        )
+        self.max_accel = math.degrees(
+            constants.max_turret_positional_velocity * ctre_motors.k_sensor_accel_to_rad_per_sec_sq
+            / constants.turret_angle_gear_ratio
+        )
+        self.min_flip_rate = constants.turret_min_flip_rate
+
+        self.flipping = False  # going somewhere other than the hub, parking or flipping ahead of it
+        self.flip_target = None
+
+    def travel_time(self, start: float, end: float, velocity: float = 0.) -> float:
+        '''
+        Time (s) to move from start to end under the trapezoid profile, stopping first if moving the wrong way
+
+        :Param float velocity: current turret velocity (deg/s)
+        '''
+        t = 0.
+        if velocity * (end - start) < 0:
+            t = abs(velocity) / self.max_accel
+            start += velocity * t / 2
+        distance = abs(end - start)
+        ramp = self.max_velocity ** 2 / self.max_accel
+        if distance < ramp:
+            return t + 2 * math.sqrt(distance / self.max_accel)
+        return t + distance / self.max_velocity + self.max_velocity / self.max_accel
+
+    def candidates(self, target: float) -> list[float]:
+        # Every turn of target that's inside the soft limits
+        k = math.ceil((self.min_angle - target) / 360)
+        angles = []
+        while target + 360 * k <= self.max_angle:
+            angles.append(target + 360 * k)
+            k += 1
+        return angles
+
+    def plan(self, target: float, current: float, velocity: float = 0., rate: float = 0.) -> float:
+        '''
+        Called once per tick
+
+        :Param float target: turret angle (degrees) that points at the hub, any number of turns off
+
+        :Param float current: turret angle (degrees)
+
+        :Param float velocity: turret velocity (deg/s)
+
+        :Param float rate: how fast target is changing from the robot's motion (deg/s, turret direction)
+
+        Returns the turret angle to go to (degrees)
+        '''
+        angles = self.candidates(target)
+        moving = abs(rate) > self.min_flip_rate
+        # Where the hub comes back into range after going through the dead zone
+        far_limit = self.min_angle if rate > 0 else self.max_angle
+
+        if self.flip_target is not None:
+            # Keep flipping until the hub shows up on that side, or turns back
+            arrived = any(abs(a - self.flip_target) < (self.max_angle - self.min_angle) / 2 for a in angles)
+            if arrived or not moving or far_limit != self.flip_target:
+                self.flip_target = None
+
+        if self.flip_target is None and angles:
+            best = min(angles, key=lambda a: self.travel_time(current, a, velocity))
+            if moving:
+                exit_limit = self.max_angle if rate > 0 else self.min_angle
+                time_to_exit = (exit_limit - best) / rate
+                time_to_return = time_to_exit + self.dead_zone / abs(rate)
+                if time_to_return <= self.travel_time(current, far_limit, velocity):
+                    self.flip_target = far_limit
+            if self.flip_target is None:
+                self.flipping = False
+                return best
+
+        self.flipping = True
+        if self.flip_target is not None:
+            return self.flip_target
+        if moving:
+            return far_limit
+        # In the dead zone and not moving, wait at the closer limit
+        if (self.min_angle - target) % 360 < (target - self.max_angle) % 360:
+            return self.min_angle
+        return self.max_angle
+
+    def reset(self):
+        self.flipping = False
+        self.flip_target = None